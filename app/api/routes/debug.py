@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, HTTPException
 from app.services.device_service import DeviceService
 from app.services.screenshot_service import ScreenshotService
@@ -13,7 +14,7 @@ async def debug_screenshot(session_id: str):
         raise HTTPException(status_code=404, detail="Session not found")
     
     screenshot_service = ScreenshotService(udid)
-    screenshot = screenshot_service.capture_screenshot()
+    screenshot = await asyncio.to_thread(screenshot_service.capture_screenshot)
     return {
         "success": screenshot is not None,
         "session_id": session_id,
@@ -23,6 +24,18 @@ async def debug_screenshot(session_id: str):
         "format": "jpeg" if screenshot else "unknown"
     }
 
+@router.get("/reload_dims/{session_id}")
+async def debug_reload_dims(session_id: str):
+    """Re-describe the device point dimensions for a specific session"""
+    udid = session_manager.get_session_udid(session_id)
+    if not udid:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    device_service = DeviceService(udid)
+    device_service.invalidate_point_dimensions()
+    point_width, point_height = await device_service.get_point_dimensions()
+    return {"session_id": session_id, "udid": udid, "point_width": point_width, "point_height": point_height}
+
 @router.get("/tap/{session_id}/{x}/{y}")
 async def debug_tap(session_id: str, x: int, y: int):
     """Debug tap endpoint for a specific session"""
@@ -34,35 +47,31 @@ async def debug_tap(session_id: str, x: int, y: int):
     success = await device_service.tap(x, y)
     return {"success": success, "session_id": session_id, "udid": udid, "x": x, "y": y}
 
-@router.get("/home/{session_id}")
-async def debug_home(session_id: str):
-    """Debug home button for a specific session"""
+@router.get("/button/{session_id}/{button}")
+async def debug_button(session_id: str, button: str):
+    """Debug button press for a specific session"""
+    if button not in DeviceService.BUTTON_MAPPING:
+        raise HTTPException(status_code=404, detail=f"Unknown button: {button}")
+    
     udid = session_manager.get_session_udid(session_id)
     if not udid:
         raise HTTPException(status_code=404, detail="Session not found")
     
     device_service = DeviceService(udid)
-    success = await device_service.press_button("home")
-    return {"success": success, "session_id": session_id, "udid": udid, "button": "home"}
+    success = await device_service.press_button(button)
+    return {"success": success, "session_id": session_id, "udid": udid, "button": button}
+
+@router.get("/home/{session_id}")
+async def debug_home(session_id: str):
+    """Debug home button for a specific session (alias of /debug/button)"""
+    return await debug_button(session_id, "home")
 
 @router.get("/lock/{session_id}")
 async def debug_lock(session_id: str):
-    """Debug lock button for a specific session"""
-    udid = session_manager.get_session_udid(session_id)
-    if not udid:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    device_service = DeviceService(udid)
-    success = await device_service.press_button("lock")
-    return {"success": success, "session_id": session_id, "udid": udid, "button": "lock"}
+    """Debug lock button for a specific session (alias of /debug/button)"""
+    return await debug_button(session_id, "lock")
 
 @router.get("/siri/{session_id}")
 async def debug_siri(session_id: str):
-    """Debug siri button for a specific session"""
-    udid = session_manager.get_session_udid(session_id)
-    if not udid:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    device_service = DeviceService(udid)
-    success = await device_service.press_button("siri")
-    return {"success": success, "session_id": session_id, "udid": udid, "button": "siri"}
\ No newline at end of file
+    """Debug siri button for a specific session (alias of /debug/button)"""
+    return await debug_button(session_id, "siri")
\ No newline at end of file
@@ -10,7 +10,7 @@ from app.core.logging import logger
 class LogStreamManager:
     def __init__(self):
         self.active_connections: Dict[str, Set[WebSocket]] = {}
-        self.log_processes: Dict[str, subprocess.Popen] = {}
+        self.log_processes: Dict[str, asyncio.subprocess.Process] = {}
         
     async def connect(self, websocket: WebSocket, session_id: str):
         """Connect a WebSocket client for log streaming"""
@@ -57,13 +57,12 @@ class LogStreamManager:
             
             logger.info(f"Starting log stream with command: {' '.join(command)}")
             
-            # Start the log process
-            process = subprocess.Popen(
-                command,
+            # Start the log process; its pipe is read without blocking the event loop
+            process = await asyncio.create_subprocess_exec(
+                *command,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                universal_newlines=True,
-                bufsize=1
+                limit=1024 * 1024  # Allow long log lines without LimitOverrunError
             )
             
             self.log_processes[session_id] = process
@@ -85,24 +84,26 @@ class LogStreamManager:
                 process.terminate()
                 # Wait a bit for graceful termination
                 try:
-                    process.wait(timeout=2)
-                except subprocess.TimeoutExpired:
+                    await asyncio.wait_for(process.wait(), timeout=2)
+                except asyncio.TimeoutError:
                     process.kill()
-                    process.wait()
+                    await process.wait()
             except Exception as e:
                 logger.error(f"Error stopping log process: {e}")
             
             del self.log_processes[session_id]
             logger.info(f"Stopped log streaming for session {session_id}")
     
-    async def _read_logs(self, session_id: str, process: subprocess.Popen):
+    async def _read_logs(self, session_id: str, process: asyncio.subprocess.Process):
         """Read logs from process and broadcast to WebSocket clients"""
         logger.info(f"Starting to read logs for session {session_id}")
         try:
-            while process.poll() is None:
-                line = process.stdout.readline()
+            while process.returncode is None:
+                line = await process.stdout.readline()
+                if not line:
+                    break  # EOF: the log process exited
+                line = line.decode(errors='replace').strip()
                 if line:
-                    line = line.strip()
                     logger.debug(f"Log line received: {line}")
                     
                     # Parse log line and create structured message
@@ -118,14 +119,14 @@ class LogStreamManager:
             await self._broadcast_error(session_id, f"Log reading error: {str(e)}")
         finally:
             # Ensure process cleanup
-            if process.poll() is None:
+            if process.returncode is None:
                 try:
                     process.terminate()
-                    process.wait(timeout=2)
+                    await asyncio.wait_for(process.wait(), timeout=2)
                 except:
                     try:
                         process.kill()
-                        process.wait()
+                        await process.wait()
                     except:
                         pass
             logger.info(f"Log reading stopped for session {session_id}")
@@ -1,5 +1,6 @@
 import json
 import asyncio
+from typing import Tuple
 from fastapi import WebSocket, WebSocketDisconnect
 from app.core.logging import logger
 from app.services.device_service import DeviceService
@@ -11,6 +12,7 @@ class ScreenshotWebSocket:
     def __init__(self, device_service: DeviceService, screenshot_service: ScreenshotService):
         self.device_service = device_service
         self.screenshot_service = screenshot_service
+        self.point_dimensions: Tuple[int, int] = (390, 844)
     
     async def handle_connection(self, websocket: WebSocket):
         """Handle screenshot mode WebSocket"""
@@ -18,6 +20,9 @@ class ScreenshotWebSocket:
         logger.info("Screenshot WebSocket connected")
         
         try:
+            # Point dimensions are fixed for the connection; resolve them once
+            self.point_dimensions = await self.device_service.get_point_dimensions()
+            
             # Send initial screenshot
             await self._send_screenshot(websocket)
             
@@ -57,10 +62,11 @@ class ScreenshotWebSocket:
     async def _send_screenshot(self, websocket: WebSocket):
         """Send screenshot to client"""
         try:
-            screenshot_data = self.screenshot_service.capture_screenshot()
+            # Capture mostly waits on idb; keep it off the event loop and off the CPU-bound image pool
+            screenshot_data = await asyncio.to_thread(self.screenshot_service.capture_screenshot)
             
             if screenshot_data:
-                point_width, point_height = await self.device_service.get_point_dimensions()
+                point_width, point_height = self.point_dimensions
                 
                 screenshot_response = ScreenshotResponse(
                     data=screenshot_data["data"],
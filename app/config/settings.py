@@ -1,5 +1,7 @@
 from typing import Optional
+import importlib.util
 import os
+import shutil
 
 class Settings:
     """Application settings"""
@@ -10,7 +12,10 @@ class Settings:
     # Video Configuration
     DEFAULT_VIDEO_FPS: int = 60
     VIDEO_QUEUE_SIZE: int = 3
+    VIDEO_BACKPRESSURE_THRESHOLD: int = 1  # Queued frames beyond this are dropped oldest-first
+    VIDEO_CLIENT_QUEUE_SIZE: int = 2  # Payloads buffered per video client before dropping
     WEBRTC_QUEUE_SIZE: int = 2
+    SCREENSHOT_IDLE_MAX_INTERVAL: float = 0.25  # Slowest screenshot-mode capture while the screen is static
     
     # Connection Management
     MAX_CONNECTIONS_PER_SESSION: int = 10
@@ -26,15 +31,28 @@ class Settings:
     DEFAULT_JPEG_QUALITY: int = 80
     WEBRTC_HIGH_QUALITY: int = 95
     
+    # idb CLI, resolved once instead of searching PATH on every spawn; IDB_PATH overrides
+    IDB_PATH: str = os.environ.get("IDB_PATH") or shutil.which("idb") or "idb"
+    
     # Timeouts
     SCREENSHOT_TIMEOUT: float = 0.5
     TAP_TIMEOUT: float = 2.0
     SWIPE_TIMEOUT: float = 3.0
     TEXT_TIMEOUT: float = 5.0
     
+    # Caching
+    TARGETS_CACHE_TTL: float = 5.0  # seconds to reuse `idb list-targets` output
+    
     # Server Configuration
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    BACKLOG: int = 2048  # Pending-connection queue for bursts of websocket reconnects
+    # uvloop is optional (unavailable on Windows); fall back to the stdlib loop
+    UVICORN_LOOP: str = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    # C HTTP parser for the upgrade handshake and REST routes; h11 is the pure-Python fallback
+    UVICORN_HTTP: str = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    # Per-request access lines are formatted and written synchronously; opt in with UVICORN_ACCESS_LOG=1
+    UVICORN_ACCESS_LOG: bool = os.environ.get("UVICORN_ACCESS_LOG", "").lower() in ("1", "true", "yes")
     
     # Paths
     STATIC_DIR: str = "static"
@@ -2,6 +2,7 @@ import signal
 import atexit
 import time
 from contextlib import asynccontextmanager
+from functools import lru_cache
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse
@@ -187,10 +188,15 @@ async def root():
     """Redirect root to /web for backward compatibility"""
     return RedirectResponse(url="/web", status_code=301)
 
+@lru_cache(maxsize=1)
+def _session_list_html() -> bytes:
+    """The session list page has no per-request content, so render it once"""
+    return templates.get_template("session_list.html").render().encode()
+
 @app.get("/web", response_class=HTMLResponse)
 async def index(request: Request):
     """Main page - session list"""
-    return templates.TemplateResponse("session_list.html", {"request": request})
+    return HTMLResponse(_session_list_html())
 
 @app.get("/control/{session_id}", response_class=HTMLResponse)
 async def control_page(request: Request, session_id: str):
@@ -337,4 +343,13 @@ signal.signal(signal.SIGTERM, lambda _sig, _frame: cleanup())
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host=settings.HOST, port=settings.PORT, log_level=settings.LOG_LEVEL.lower())
\ No newline at end of file
+    uvicorn.run(
+        app,
+        host=settings.HOST,
+        port=settings.PORT,
+        backlog=settings.BACKLOG,
+        log_level=settings.LOG_LEVEL.lower(),
+        loop=settings.UVICORN_LOOP,
+        http=settings.UVICORN_HTTP,
+        access_log=settings.UVICORN_ACCESS_LOG
+    )
\ No newline at end of file
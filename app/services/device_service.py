@@ -1,21 +1,58 @@
-import subprocess
+import asyncio
 import re
-from typing import Tuple, Optional
+import time
+from typing import Dict, Sequence, Tuple, Optional
 from app.config.settings import settings
 from app.core.logging import logger
 from app.core.exceptions import DeviceNotAccessibleException
 
+# Both point dimensions from `idb describe` in a single scan
+_POINT_DIMENSIONS_RE = re.compile(r'width_points=(\d+).*?height_points=(\d+)', re.S)
+
 class DeviceService:
     """Service for device interactions"""
     
+    # `idb list-targets` output shared by all instances: (monotonic time, stdout)
+    _targets_cache: Tuple[float, str] = (float("-inf"), "")
+    
+    # Point dimensions only change with the device, so they are described once per UDID
+    _point_dimensions_by_udid: Dict[str, Tuple[int, int]] = {}
+    
+    # idb names for the buttons clients send
+    BUTTON_MAPPING = {
+        'home': 'HOME', 'lock': 'LOCK', 'siri': 'SIRI',
+        'side-button': 'SIDE_BUTTON', 'apple-pay': 'APPLE_PAY'
+    }
+    
     def __init__(self, udid: Optional[str] = None):
-        self.udid = udid
         self._point_dimensions_cache: Optional[Tuple[int, int]] = None
+        self.set_udid(udid)
     
     def set_udid(self, udid: str):
         """Set the UDID for this service instance"""
         self.udid = udid
         self._point_dimensions_cache = None  # Reset cache when UDID changes
+        # argv pieces that only depend on the UDID are built once, not per input event
+        self._udid_args: Tuple[str, ...] = ("--udid", udid) if udid else ()
+        self._button_commands: Dict[str, Tuple[str, ...]] = {
+            button: ("ui", "button", idb_button, *self._udid_args)
+            for button, idb_button in self.BUTTON_MAPPING.items()
+        }
+    
+    async def _run_idb(self, args: Sequence[str], timeout: float) -> Tuple[int, str, str]:
+        """Run an idb command without blocking the event loop"""
+        process = await asyncio.create_subprocess_exec(
+            settings.IDB_PATH, *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise
+        return process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
     
     async def get_point_dimensions(self) -> Tuple[int, int]:
         """Get device point dimensions with caching"""
@@ -25,19 +62,20 @@ class DeviceService:
         if self._point_dimensions_cache:
             return self._point_dimensions_cache
         
+        shared = DeviceService._point_dimensions_by_udid.get(self.udid)
+        if shared:
+            self._point_dimensions_cache = shared
+            return shared
+        
         try:
-            cmd = ["idb", "describe", "--udid", self.udid]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=3)
+            returncode, stdout, _ = await self._run_idb(("describe", *self._udid_args), timeout=3)
             
-            if result.returncode == 0:
-                width_match = re.search(r'width_points=(\d+)', result.stdout)
-                height_match = re.search(r'height_points=(\d+)', result.stdout)
+            if returncode == 0:
+                match = _POINT_DIMENSIONS_RE.search(stdout)
                 
-                if width_match and height_match:
-                    self._point_dimensions_cache = (
-                        int(width_match.group(1)), 
-                        int(height_match.group(1))
-                    )
+                if match:
+                    self._point_dimensions_cache = (int(match.group(1)), int(match.group(2)))
+                    DeviceService._point_dimensions_by_udid[self.udid] = self._point_dimensions_cache
                     return self._point_dimensions_cache
         except Exception as e:
             logger.error(f"Error getting point dimensions: {e}")
@@ -46,6 +84,11 @@ class DeviceService:
         self._point_dimensions_cache = (390, 844)
         return self._point_dimensions_cache
     
+    def invalidate_point_dimensions(self):
+        """Forget the described point dimensions so the next lookup re-runs `idb describe`"""
+        self._point_dimensions_cache = None
+        DeviceService._point_dimensions_by_udid.pop(self.udid, None)
+    
     async def tap(self, x: int, y: int) -> bool:
         """Perform tap gesture"""
         if not self.udid:
@@ -53,15 +96,14 @@ class DeviceService:
             return False
             
         try:
-            cmd = ["idb", "ui", "tap", str(x), str(y), "--udid", self.udid]
-            result = subprocess.run(cmd, capture_output=True, text=True, 
-                                  timeout=settings.TAP_TIMEOUT)
+            cmd = ("ui", "tap", f"{x}", f"{y}", *self._udid_args)
+            returncode, _, stderr = await self._run_idb(cmd, timeout=settings.TAP_TIMEOUT)
             
-            if result.returncode == 0:
+            if returncode == 0:
                 logger.info(f"✅ Tap: ({x}, {y}) on {self.udid}")
                 return True
             else:
-                logger.error(f"❌ Tap failed: {result.stderr}")
+                logger.error(f"❌ Tap failed: {stderr}")
                 return False
         except Exception as e:
             logger.error(f"Tap error: {e}")
@@ -76,19 +118,18 @@ class DeviceService:
             return False
             
         try:
-            cmd = [
-                "idb", "ui", "swipe", 
-                str(start_x), str(start_y), str(end_x), str(end_y),
-                "--duration", str(duration), "--udid", self.udid
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, 
-                                  timeout=settings.SWIPE_TIMEOUT)
+            cmd = (
+                "ui", "swipe",
+                f"{start_x}", f"{start_y}", f"{end_x}", f"{end_y}",
+                "--duration", f"{duration}", *self._udid_args
+            )
+            returncode, _, stderr = await self._run_idb(cmd, timeout=settings.SWIPE_TIMEOUT)
             
-            if result.returncode == 0:
+            if returncode == 0:
                 logger.info(f"✅ Swipe: ({start_x}, {start_y}) -> ({end_x}, {end_y}) on {self.udid}")
                 return True
             else:
-                logger.error(f"❌ Swipe failed: {result.stderr}")
+                logger.error(f"❌ Swipe failed: {stderr}")
                 return False
         except Exception as e:
             logger.error(f"Swipe error: {e}")
@@ -101,11 +142,10 @@ class DeviceService:
             return False
             
         try:
-            cmd = ["idb", "ui", "text", text, "--udid", self.udid]
-            result = subprocess.run(cmd, capture_output=True, text=True, 
-                                  timeout=settings.TEXT_TIMEOUT)
+            cmd = ("ui", "text", text, *self._udid_args)
+            returncode, _, _ = await self._run_idb(cmd, timeout=settings.TEXT_TIMEOUT)
             
-            if result.returncode == 0:
+            if returncode == 0:
                 logger.info("✅ Text entered")
                 return True
             else:
@@ -122,18 +162,17 @@ class DeviceService:
             return False
             
         try:
-            cmd = ["idb", "ui", "key", key, "--udid", self.udid]
+            cmd = ("ui", "key", key, *self._udid_args)
             if duration is not None:
-                cmd.extend(["--duration", str(duration)])
+                cmd += ("--duration", f"{duration}")
                 
-            result = subprocess.run(cmd, capture_output=True, text=True, 
-                                  timeout=settings.TEXT_TIMEOUT)
+            returncode, _, stderr = await self._run_idb(cmd, timeout=settings.TEXT_TIMEOUT)
             
-            if result.returncode == 0:
+            if returncode == 0:
                 logger.info(f"✅ Key entered: {key}")
                 return True
             else:
-                logger.error(f"❌ Key failed: {key} - {result.stderr}")
+                logger.error(f"❌ Key failed: {key} - {stderr}")
                 return False
         except Exception as e:
             logger.error(f"Key input error: {e}")
@@ -146,17 +185,12 @@ class DeviceService:
             return False
             
         try:
-            button_mapping = {
-                'home': 'HOME', 'lock': 'LOCK', 'siri': 'SIRI',
-                'side-button': 'SIDE_BUTTON', 'apple-pay': 'APPLE_PAY'
-            }
-            idb_button = button_mapping.get(button, button.upper())
-            
-            cmd = ["idb", "ui", "button", idb_button, "--udid", self.udid]
-            result = subprocess.run(cmd, capture_output=True, text=True, 
-                                  timeout=settings.TAP_TIMEOUT)
+            cmd = self._button_commands.get(button)
+            if cmd is None:
+                cmd = ("ui", "button", button.upper(), *self._udid_args)
+            returncode, _, _ = await self._run_idb(cmd, timeout=settings.TAP_TIMEOUT)
             
-            if result.returncode == 0:
+            if returncode == 0:
                 logger.info(f"✅ Button: {button} on {self.udid}")
                 return True
             else:
@@ -172,8 +206,10 @@ class DeviceService:
             return False
             
         try:
-            cmd = ["idb", "list-targets"]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-            return self.udid in result.stdout
+            checked_at, targets = DeviceService._targets_cache
+            if time.monotonic() - checked_at >= settings.TARGETS_CACHE_TTL:
+                _, targets, _ = await self._run_idb(["list-targets"], timeout=5)
+                DeviceService._targets_cache = (time.monotonic(), targets)
+            return self.udid in targets
         except Exception:
             return False
\ No newline at end of file
@@ -2,18 +2,22 @@ import threading
 import time
 import asyncio
 import uuid
-import base64
-import io
 from typing import Dict, Optional
-from queue import Queue, Empty
+from concurrent.futures import Future
 import av
+import cv2
 import numpy as np
-from PIL import Image
 from fractions import Fraction
 from aiortc import RTCPeerConnection, RTCSessionDescription, VideoStreamTrack, RTCIceCandidate, RTCConfiguration
+from aiortc.mediastreams import MediaStreamError
 
 from app.core.logging import logger
 from app.services.screenshot_service import ScreenshotService
+from app.utils.image_utils import IMAGE_EXECUTOR, ImageUtils
+from app.services.webrtc_common import RelayedTrackMixin, LatestFrameMixin
+
+# Simple WebRTC configuration for speed, shared by every peer connection
+RTC_CONFIGURATION = RTCConfiguration(iceServers=[])
 
 class FastVideoTrack(VideoStreamTrack):
     """Fast video track optimized for low latency streaming"""
@@ -26,10 +30,18 @@ class FastVideoTrack(VideoStreamTrack):
         self.frame_interval = 1.0 / target_fps
         self.start_time = time.time()
         self.last_frame_data = None
+        # Built once, used until the first real frame arrives
+        self._placeholder = av.VideoFrame.from_ndarray(
+            np.zeros((200, 200, 3), dtype=np.uint8),
+            format='rgb24'
+        )
         logger.info(f"🚀 FastVideoTrack initialized: {target_fps}fps")
     
     async def recv(self):
         """Generate fast video frames with consistent timing"""
+        if self.readyState != "live":
+            raise MediaStreamError
+        
         # Calculate precise frame timing
         target_time = self.start_time + (self.frame_count * self.frame_interval)
         current_time = time.time()
@@ -49,11 +61,8 @@ class FastVideoTrack(VideoStreamTrack):
             # Reuse last frame if no new data
             frame = self.last_frame_data
         else:
-            # Create minimal placeholder
-            frame = av.VideoFrame.from_ndarray(
-                np.zeros((200, 200, 3), dtype=np.uint8),
-                format='rgb24'
-            )
+            # Minimal placeholder
+            frame = self._placeholder
         
         # Set WebRTC timing
         frame.pts = self.frame_count
@@ -62,16 +71,18 @@ class FastVideoTrack(VideoStreamTrack):
         self.frame_count += 1
         return frame
 
-class FastWebRTCService:
+class FastWebRTCService(RelayedTrackMixin, LatestFrameMixin):
     """Fast WebRTC service optimized for continuous streaming with low latency"""
     
+    track_class = FastVideoTrack
+    
     def __init__(self, udid: Optional[str] = None):
         self.udid = udid
         
         # WebRTC state
         self.peer_connections: Dict[str, RTCPeerConnection] = {}
         self.stream_active = False
-        self.frame_queue = Queue(maxsize=1)  # Single frame buffer for lowest latency
+        self._init_latest_frame()
         
         # Stream processing
         self.frame_thread = None
@@ -84,6 +95,8 @@ class FastWebRTCService:
         self._last_src_size = None  # (w, h)
         self._last_enc_size = None  # (w, h)
         
+        self._init_relay()
+        
         logger.info(f"🚀 FastWebRTCService initialized for {udid}")
     
     def set_udid(self, udid: str):
@@ -128,81 +141,39 @@ class FastWebRTCService:
         """Generate frames continuously for smooth streaming"""
         logger.info(f"🎬 Starting fast frame generation for {self.udid} @ {self.target_fps}fps")
         
+        # Decode/resize of frame N runs on the image pool while frame N+1 is captured;
+        # each frame is published as soon as its own conversion finishes
+        pending_frame: Optional[Future] = None
+        
         try:
             screenshot_service = ScreenshotService(self.udid)
             
             frame_count = 0
             frame_interval = 1.0 / self.target_fps
-            next_frame_time = time.time()
-            last_log_time = time.time()
+            next_frame_time = time.monotonic()
+            last_log_time = next_frame_time
             
             while self.stream_active:
-                current_time = time.time()
-                
-                # Precise timing control
-                if current_time < next_frame_time:
-                    sleep_time = next_frame_time - current_time
-                    if sleep_time > 0.001:
-                        time.sleep(sleep_time)
-                    continue
+                # Sleep once until the frame is due rather than spinning on the clock
+                sleep_time = next_frame_time - time.monotonic()
+                if sleep_time > 0:
+                    time.sleep(sleep_time)
+                current_time = time.monotonic()
                 
                 try:
                     # Fast screenshot capture
                     if self.quality_preset in ["high", "ultra"]:
-                        screenshot_data = screenshot_service.capture_high_quality_screenshot()
+                        screenshot_data = screenshot_service.capture_high_quality_screenshot(include_base64=False)
                     else:
-                        screenshot_data = screenshot_service.capture_ultra_fast_screenshot()
+                        screenshot_data = screenshot_service.capture_ultra_fast_screenshot(include_base64=False)
                     
-                    if screenshot_data and "data" in screenshot_data:
-                        # Quick image processing
-                        image_bytes = base64.b64decode(screenshot_data["data"])
-                        
-                        with Image.open(io.BytesIO(image_bytes)) as img:
-                            if img.mode != 'RGB':
-                                img = img.convert('RGB')
-                            
-                            src_w, src_h = img.width, img.height
-                            if self._last_src_size != (src_w, src_h):
-                                logger.info(f"🖼️ Source screenshot size: {src_w}x{src_h}")
-                                self._last_src_size = (src_w, src_h)
-                            
-                            # Determine scale factor per preset (relative to source), preserve aspect ratio
-                            # Chosen to balance quality vs latency; avoid upscaling
-                            scale_map = {
-                                'low': 0.25,
-                                'medium': 0.33,
-                                'high': 0.40,
-                                'ultra': 0.45,
-                            }
-                            scale = max(0.1, min(1.0, scale_map.get(self.quality_preset, 0.33)))
-                            
-                            target_w = max(2, int(src_w * scale))
-                            target_h = max(2, int(src_h * scale))
-                            
-                            # Fast resize with reasonable quality
-                            if target_w != src_w or target_h != src_h:
-                                img = img.resize((target_w, target_h), Image.Resampling.BILINEAR)
-                            
-                            if self._last_enc_size != (img.width, img.height):
-                                logger.info(f"🎯 Encoded frame size: {img.width}x{img.height} (preset={self.quality_preset}, scale={scale:.2f})")
-                                self._last_enc_size = (img.width, img.height)
-                            
-                            # Convert to frame
-                            img_array = np.array(img, dtype=np.uint8)
-                            av_frame = av.VideoFrame.from_ndarray(img_array, format='rgb24')
-                            
-                            # Replace frame in queue (always fresh frame)
-                            while not self.frame_queue.empty():
-                                try:
-                                    self.frame_queue.get_nowait()
-                                except Empty:
-                                    break
-                            
-                            try:
-                                self.frame_queue.put_nowait(av_frame)
-                                frame_count += 1
-                            except:
-                                pass  # Queue management
+                    if screenshot_data and "bytes" in screenshot_data:
+                        # Keep one conversion in flight so frames publish in capture order
+                        if pending_frame is not None:
+                            pending_frame.exception()  # Waits without re-raising
+                        pending_frame = IMAGE_EXECUTOR.submit(self._convert_frame, screenshot_data)
+                        pending_frame.add_done_callback(self._on_frame_converted)
+                        frame_count += 1
                     
                     # Update timing
                     next_frame_time += frame_interval
@@ -214,12 +185,13 @@ class FastWebRTCService:
                     # Periodic status
                     if current_time - last_log_time >= 15.0:
                         actual_fps = frame_count / (current_time - last_log_time) if (current_time - last_log_time) > 0 else 0
-                        logger.info(f"📊 Fast WebRTC {self.udid}: {frame_count} frames, {actual_fps:.1f}fps, queue: {self.frame_queue.qsize()}, enc: {self._last_enc_size}")
+                        logger.info(f"📊 Fast WebRTC {self.udid}: {frame_count} frames, {actual_fps:.1f}fps, queue: {len(self._latest_frames)}, enc: {self._last_enc_size}")
                         last_log_time = current_time
                         frame_count = 0
                 
                 except Exception as e:
                     logger.debug(f"Frame generation error: {e}")
+                    pending_frame = None
                     next_frame_time += frame_interval
                     
         except Exception as e:
@@ -227,13 +199,51 @@ class FastWebRTCService:
         finally:
             logger.info(f"🛑 Fast frame generation stopped for {self.udid}")
     
+    def _convert_frame(self, screenshot_data: Dict) -> av.VideoFrame:
+        """Decode, scale and convert a screenshot to a video frame (runs on the image pool)"""
+        src_w = screenshot_data.get("pixel_width") or 0
+        src_h = screenshot_data.get("pixel_height") or 0
+        if self._last_src_size != (src_w, src_h):
+            logger.info(f"🖼️ Source screenshot size: {src_w}x{src_h}")
+            self._last_src_size = (src_w, src_h)
+        
+        # Determine scale factor per preset (relative to source), preserve aspect ratio
+        # Chosen to balance quality vs latency; avoid upscaling
+        scale_map = {
+            'low': 0.25,
+            'medium': 0.33,
+            'high': 0.40,
+            'ultra': 0.45,
+        }
+        scale = max(0.1, min(1.0, scale_map.get(self.quality_preset, 0.33)))
+        
+        # yuv420p needs even dimensions
+        target_w = max(2, int(src_w * scale) & ~1)
+        target_h = max(2, int(src_h * scale) & ~1)
+        
+        # Downscale during JPEG decode instead of resizing a full-size PIL image
+        bgr = ImageUtils.decode_jpeg_to_size(screenshot_data["bytes"], target_w, target_h)
+        
+        if self._last_enc_size != (target_w, target_h):
+            logger.info(f"🎯 Encoded frame size: {target_w}x{target_h} (preset={self.quality_preset}, scale={scale:.2f})")
+            self._last_enc_size = (target_w, target_h)
+        
+        # Hand the encoder planar YUV directly: half the bytes of BGR, and its own
+        # reformat to yuv420p becomes a no-op instead of a swscale pass per frame
+        i420 = cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420)
+        return av.VideoFrame.from_ndarray(i420, format='yuv420p')
+    
+    def _on_frame_converted(self, future: Future):
+        """Publish a converted frame straight from the image pool"""
+        error = future.exception()
+        if error is not None:
+            logger.debug(f"Frame conversion error: {error}")
+        elif self.stream_active:
+            self._publish_frame(future.result())
+    
     async def get_fast_frame(self):
         """Get next frame with minimal delay"""
-        try:
-            frame = self.frame_queue.get(timeout=0.02)  # Very short timeout
-            return frame
-        except Empty:
-            return None
+        return await self._wait_for_frame(0.02)  # Very short timeout
     
     def stop_video_stream(self):
         """Stop video streaming and cleanup"""
@@ -243,21 +253,9 @@ class FastWebRTCService:
             self.stream_active = False
             
             # Clear frame queue
-            while not self.frame_queue.empty():
-                try:
-                    self.frame_queue.get_nowait()
-                except Empty:
-                    break
-        
-        # Close all peer connections
-        connections_to_close = list(self.peer_connections.items())
-        self.peer_connections.clear()
+            self._take_frame()
         
-        for connection_id, pc in connections_to_close:
-            try:
-                asyncio.create_task(pc.close())
-            except Exception as e:
-                logger.debug(f"Error closing connection {connection_id}: {e}")
+        self._stop_track_and_peers()
     
     async def create_peer_connection(self) -> tuple[str, RTCPeerConnection]:
         """Create new WebRTC peer connection optimized for speed"""
@@ -267,13 +265,10 @@ class FastWebRTCService:
         
         connection_id = str(uuid.uuid4())
         
-        # Simple WebRTC configuration for speed
-        config = RTCConfiguration(iceServers=[])
-        pc = RTCPeerConnection(configuration=config)
+        pc = RTCPeerConnection(configuration=RTC_CONFIGURATION)
         
-        # Add fast video track
-        video_track = FastVideoTrack(self, target_fps=self.target_fps)
-        pc.addTrack(video_track)
+        # Add fast video track; one source per stream, relayed so every peer gets every frame
+        pc.addTrack(self._relay.subscribe(self._get_video_track(), buffered=False))
         
         @pc.on("connectionstatechange")
         async def on_connectionstatechange():  # noqa: F841
@@ -365,7 +360,7 @@ class FastWebRTCService:
             "connections": len(self.peer_connections),
             "quality": self.quality_preset,
             "fps": self.target_fps,
-            "queue_size": self.frame_queue.qsize(),
+            "queue_size": len(self._latest_frames),
             "udid": self.udid,
             "type": "fast_screenshot_webrtc"
         }
\ No newline at end of file
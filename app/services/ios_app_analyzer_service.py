@@ -78,11 +78,12 @@ class AppAnalyzer:
         
         try:
             # Basic file validation
-            if not os.path.exists(file_path):
+            try:
+                app_info.file_size = os.stat(file_path).st_size
+            except FileNotFoundError:
                 app_info.error_details = f"File not found: {file_path}"
                 return AppCompatibility.INVALID_FORMAT, app_info
             
-            app_info.file_size = os.path.getsize(file_path)
             self._log(f"Analyzing file: {os.path.basename(file_path)} ({app_info.file_size} bytes)")
             
             # Determine file type and analyze
@@ -3,16 +3,21 @@ import time
 import asyncio
 import uuid
 import subprocess
-import tempfile
-import os
 from typing import Dict, Optional, AsyncGenerator
-from queue import Queue, Empty
 import av
 import numpy as np
 from fractions import Fraction
 from aiortc import RTCPeerConnection, RTCSessionDescription, VideoStreamTrack, RTCIceCandidate, RTCConfiguration
+from aiortc.mediastreams import MediaStreamError
 
+from app.config.settings import settings
 from app.core.logging import logger
+from app.services.webrtc_common import RelayedTrackMixin
+
+# WebRTC configuration optimized for low latency, shared by every peer connection
+RTC_CONFIGURATION = RTCConfiguration(
+    iceServers=[],  # Local network only for minimal latency
+)
 
 class IDBVideoStreamTrack(VideoStreamTrack):
     """Ultra low-latency video track using direct idb video-stream H.264 data"""
@@ -25,13 +30,24 @@ class IDBVideoStreamTrack(VideoStreamTrack):
         self.frame_interval = 1.0 / target_fps
         self.start_time = time.time()
         self.last_pts = 0
+        self._last_frame_seq = 0
+        # Built once and re-stamped whenever no decoded frame is ready
+        self._placeholder = av.VideoFrame.from_ndarray(
+            np.zeros((100, 100, 3), dtype=np.uint8),  # Minimal size
+            format='rgb24'
+        )
         logger.info(f"🚀 IDBVideoStreamTrack initialized: {target_fps}fps for ultra-low latency")
     
     async def recv(self):
         """Receive H.264 frames directly from idb video stream"""
+        if self.readyState != "live":
+            raise MediaStreamError
+        
         try:
-            # Get H.264 frame from service
-            frame = await self.service.get_h264_frame()
+            # Wait up to one frame interval for a frame newer than the last one sent
+            frame, self._last_frame_seq = await self.service.get_h264_frame(
+                self._last_frame_seq, self.frame_interval
+            )
             
             if frame is not None:
                 # Set precise timing for minimal latency
@@ -46,30 +62,26 @@ class IDBVideoStreamTrack(VideoStreamTrack):
                 return frame
             
             # Return a minimal placeholder if no frame available
-            placeholder = av.VideoFrame.from_ndarray(
-                np.zeros((100, 100, 3), dtype=np.uint8),  # Minimal size
-                format='rgb24'
-            )
-            placeholder.pts = self.last_pts + int(self.frame_interval * 90000)
-            placeholder.time_base = Fraction(1, 90000)
-            self.last_pts = placeholder.pts
-            return placeholder
+            return self._next_placeholder()
             
         except Exception as e:
             logger.debug(f"Frame recv error: {e}")
             # Return minimal placeholder on error
-            placeholder = av.VideoFrame.from_ndarray(
-                np.zeros((100, 100, 3), dtype=np.uint8),
-                format='rgb24'
-            )
-            placeholder.pts = self.last_pts + int(self.frame_interval * 90000)
-            placeholder.time_base = Fraction(1, 90000)
-            self.last_pts = placeholder.pts
-            return placeholder
+            return self._next_placeholder()
+    
+    def _next_placeholder(self):
+        """Re-stamp the cached placeholder frame for the next frame slot"""
+        placeholder = self._placeholder
+        placeholder.pts = self.last_pts + int(self.frame_interval * 90000)
+        placeholder.time_base = Fraction(1, 90000)
+        self.last_pts = placeholder.pts
+        return placeholder
 
-class LowLatencyWebRTCService:
+class LowLatencyWebRTCService(RelayedTrackMixin):
     """Ultra low-latency WebRTC service using direct idb video-stream H.264"""
     
+    track_class = IDBVideoStreamTrack
+    
     def __init__(self, udid: Optional[str] = None):
         self.udid = udid
         
@@ -79,8 +91,13 @@ class LowLatencyWebRTCService:
         
         # H.264 streaming
         self.h264_process = None
-        self.h264_file = None
-        self.frame_queue = Queue(maxsize=2)  # Minimal buffer for ultra-low latency
+        
+        # Latest decoded frame only; the decoder thread swaps it in, tracks read it
+        self._latest_frame = None
+        self._latest_seq = 0
+        self._latest_lock = threading.Lock()
+        self._frame_event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
         
         # Stream processing
         self.frame_thread = None
@@ -91,6 +108,8 @@ class LowLatencyWebRTCService:
         self.video_bitrate = 2000000  # 2Mbps for good quality
         self.keyframe_interval = 30  # I-frame every 30 frames (0.5s at 60fps)
         
+        self._init_relay()
+        
         logger.info(f"🚀 LowLatencyWebRTCService initialized for {udid}")
     
     def set_udid(self, udid: str):
@@ -153,143 +172,128 @@ class LowLatencyWebRTCService:
     def _start_h264_stream(self) -> bool:
         """Start idb video-stream process with optimized settings"""
         try:
-            # Create temporary file for H.264 stream
-            self.h264_file = tempfile.NamedTemporaryFile(suffix='.h264', delete=False)
-            self.h264_file.close()
-            
-            # Ultra low-latency idb command
+            # Ultra low-latency idb command; without an output file idb writes H.264 to stdout
             cmd = [
-                "idb", "video-stream",
+                settings.IDB_PATH, "video-stream",
                 "--udid", self.udid,
                 "--format", "h264",
                 "--fps", str(self.target_fps),
-                "--compression-quality", "0.8",  # Higher quality for better frames
-                self.h264_file.name
+                "--compression-quality", "0.8"  # Higher quality for better frames
             ]
             
             logger.info(f"🎬 Starting idb video-stream: {' '.join(cmd)}")
             
-            # Start H.264 capture process
+            # Start H.264 capture process; unbuffered, since PyAV does its own read buffering.
+            # Startup failures surface in _process_h264_frames when the stream ends early.
             self.h264_process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
+                stderr=subprocess.PIPE,
+                bufsize=0
             )
             
-            # Give it a moment to start and create initial data
-            time.sleep(0.5)
-            
-            if self.h264_process.poll() is not None:
-                stderr = self.h264_process.stderr.read().decode()
-                logger.error(f"❌ idb video-stream failed to start: {stderr}")
-                return False
-            
-            # Check if file is being written
-            if os.path.exists(self.h264_file.name) and os.path.getsize(self.h264_file.name) > 0:
-                logger.info(f"✅ idb video-stream started successfully, file: {self.h264_file.name}")
-                return True
-            else:
-                logger.warning(f"⚠️  H.264 file not created yet, waiting...")
-                time.sleep(0.5)
-                return os.path.exists(self.h264_file.name)
+            logger.info(f"✅ idb video-stream started for {self.udid}")
+            return True
             
         except Exception as e:
             logger.error(f"❌ Error starting H.264 stream: {e}")
             return False
     
     def _process_h264_frames(self):
-        """Process H.264 frames from file with minimal latency"""
+        """Decode the H.264 stream as it arrives, keeping only the newest frame"""
         logger.info(f"🎬 Starting low-latency H.264 frame processing for {self.udid}")
         
+        container = None
         try:
-            last_size = 0
             frame_count = 0
             last_log_time = time.time()
             
-            # Wait for initial data
-            while self.stream_active and not os.path.exists(self.h264_file.name):
-                time.sleep(0.1)
+            # Demux straight from the pipe so every access unit is decoded exactly once
+            # Minimal probing and no demuxer delay so frames aren't held back
+            container = av.open(
+                self.h264_process.stdout, mode='r', format='h264',
+                options={
+                    "fflags": "nobuffer",
+                    "flags": "low_delay",
+                    "probesize": "32",
+                    "analyzeduration": "0",
+                    "max_delay": "0",
+                }
+            )
+            
+            # Slice threading only; frame threading would delay output by one frame per thread
+            video_stream = container.streams.video[0]
+            video_stream.codec_context.thread_type = "SLICE"
+            # Container options only reach the probe decoders; ask the real one for
+            # low_delay so it skips the reorder buffer (applied when it opens on first decode)
+            video_stream.codec_context.options = {"flags": "low_delay"}
             
-            while self.stream_active and self.h264_process and self.h264_process.poll() is None:
-                try:
-                    if not os.path.exists(self.h264_file.name):
-                        time.sleep(0.01)
-                        continue
-                    
-                    current_size = os.path.getsize(self.h264_file.name)
-                    
-                    # Check if new data is available
-                    if current_size > last_size:
-                        try:
-                            # Try to decode the entire file periodically for frames
-                            container = av.open(self.h264_file.name, 'r')
-                            
-                            if container.streams.video:
-                                video_stream = container.streams.video[0]
-                                
-                                # Seek to near the end for latest frames (low latency)
-                                frames_decoded = 0
-                                for frame in container.decode(video_stream):
-                                    frames_decoded += 1
-                                    
-                                    # Only keep the most recent frames (skip frames for ultra-low latency)
-                                    if frames_decoded % 2 == 0:  # Every 2nd frame for minimum latency
-                                        # Clear old frames from queue
-                                        while not self.frame_queue.empty():
-                                            try:
-                                                self.frame_queue.get_nowait()
-                                            except Empty:
-                                                break
-                                        
-                                        # Add fresh frame
-                                        try:
-                                            self.frame_queue.put_nowait(frame)
-                                            frame_count += 1
-                                        except:
-                                            pass  # Queue full
-                                        
-                                        # Break after adding one frame for low latency
-                                        break
-                            
-                            container.close()
-                            last_size = current_size
-                            
-                        except Exception as decode_error:
-                            logger.debug(f"H.264 decode error: {decode_error}")
-                            time.sleep(0.01)
-                    else:
-                        time.sleep(0.01)  # Wait for new data
-                    
-                    # Periodic logging
-                    current_time = time.time()
-                    if current_time - last_log_time >= 10.0:
-                        logger.info(f"📊 Low-latency H.264 for {self.udid}: {frame_count} frames processed, queue: {self.frame_queue.qsize()}")
-                        last_log_time = current_time
-                        frame_count = 0
+            for frame in container.decode(video_stream):
+                if not self.stream_active:
+                    break
+                
+                # Replace the previous frame so tracks always send the latest one
+                with self._latest_lock:
+                    self._latest_frame = frame
+                    self._latest_seq += 1
+                frame_count += 1
                 
-                except Exception as e:
-                    logger.debug(f"Frame processing error: {e}")
-                    time.sleep(0.01)
+                loop = self._loop
+                if loop is not None:
+                    try:
+                        loop.call_soon_threadsafe(self._notify_frame)
+                    except RuntimeError:
+                        pass  # Event loop closed
+                
+                # Periodic logging
+                current_time = time.time()
+                if current_time - last_log_time >= 10.0:
+                    logger.info(f"📊 Low-latency H.264 for {self.udid}: {frame_count} frames processed")
+                    last_log_time = current_time
+                    frame_count = 0
                     
         except Exception as e:
-            logger.error(f"H.264 frame processing error for {self.udid}: {e}")
+            if self.stream_active:
+                logger.error(f"H.264 frame processing error for {self.udid}: {e}")
         finally:
-            # Cleanup
-            try:
-                if hasattr(self, 'h264_file') and os.path.exists(self.h264_file.name):
-                    os.unlink(self.h264_file.name)
-            except:
-                pass
+            if container is not None:
+                container.close()
+            
+            # The decoder only stops on its own when idb exits; report why
+            process = self.h264_process
+            if self.stream_active and process is not None:
+                try:
+                    process.wait(timeout=1)
+                    stderr = process.stderr.read().decode(errors='replace')
+                    logger.error(f"❌ idb video-stream exited for {self.udid}: {stderr}")
+                except subprocess.TimeoutExpired:
+                    pass
             logger.info(f"🛑 H.264 frame processing stopped for {self.udid}")
     
-    async def get_h264_frame(self):
-        """Get next H.264 frame with ultra-low latency"""
+    def _notify_frame(self):
+        """Wake tracks waiting for a new frame (runs on the event loop)"""
+        if self._frame_event is not None:
+            self._frame_event.set()
+            self._frame_event = None
+    
+    async def get_h264_frame(self, last_seq: int, timeout: float):
+        """Get the latest decoded frame if it is newer than last_seq, waiting up to timeout for one"""
+        self._loop = asyncio.get_running_loop()
+        
+        with self._latest_lock:
+            if self._latest_seq != last_seq:
+                return self._latest_frame, self._latest_seq
+        
+        # Every waiting track shares the event; _notify_frame sets it and starts a new one
+        if self._frame_event is None:
+            self._frame_event = asyncio.Event()
         try:
-            # Very short timeout for minimal latency
-            frame = self.frame_queue.get(timeout=0.01)
-            return frame
-        except Empty:
-            return None
+            await asyncio.wait_for(self._frame_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None, last_seq
+        
+        with self._latest_lock:
+            return self._latest_frame, self._latest_seq
     
     def stop_video_stream(self):
         """Stop video streaming and cleanup"""
@@ -310,22 +314,11 @@ class LowLatencyWebRTCService:
                         pass
                 self.h264_process = None
             
-            # Clear frame queue
-            while not self.frame_queue.empty():
-                try:
-                    self.frame_queue.get_nowait()
-                except Empty:
-                    break
-        
-        # Close all peer connections
-        connections_to_close = list(self.peer_connections.items())
-        self.peer_connections.clear()
+            # Drop the last frame
+            with self._latest_lock:
+                self._latest_frame = None
         
-        for connection_id, pc in connections_to_close:
-            try:
-                asyncio.create_task(pc.close())
-            except Exception as e:
-                logger.debug(f"Error closing connection {connection_id}: {e}")
+        self._stop_track_and_peers()
     
     async def create_peer_connection(self) -> tuple[str, RTCPeerConnection]:
         """Create new WebRTC peer connection with low-latency settings"""
@@ -335,14 +328,10 @@ class LowLatencyWebRTCService:
         
         connection_id = str(uuid.uuid4())
         
-        # WebRTC configuration optimized for low latency
-        config = RTCConfiguration(
-            iceServers=[],  # Local network only for minimal latency
-        )
-        pc = RTCPeerConnection(configuration=config)
+        pc = RTCPeerConnection(configuration=RTC_CONFIGURATION)
         
-        # Add video track with low-latency settings
-        video_track = IDBVideoStreamTrack(self, target_fps=self.target_fps)
+        # Add video track with low-latency settings; one source per stream, relayed so every peer gets every frame
+        video_track = self._relay.subscribe(self._get_video_track(), buffered=False)
         transceiver = pc.addTransceiver(video_track, direction="sendonly")
         
         # Optimize transceiver for low latency
@@ -472,7 +461,7 @@ class LowLatencyWebRTCService:
             "fps": self.target_fps,
             "bitrate": self.video_bitrate,
             "keyframe_interval": self.keyframe_interval,
-            "queue_size": self.frame_queue.qsize(),
+            "frames_decoded": self._latest_seq,
             "udid": self.udid,
             "type": "low_latency_h264"
         }
\ No newline at end of file
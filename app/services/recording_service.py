@@ -38,13 +38,14 @@ class RecordingService:
                 self.recording_file = temp_file.name
             
             # Start idb record-video command
-            cmd = ["idb", "record-video", self.recording_file, "--udid", self.udid]
+            cmd = [settings.IDB_PATH, "record-video", self.recording_file, "--udid", self.udid]
             
             logger.info(f"Starting video recording: {' '.join(cmd)}")
             
             self.recording_process = subprocess.Popen(
                 cmd,
-                stdout=subprocess.PIPE,
+                # stdout is never read; an undrained pipe could stall a long recording
+                stdout=subprocess.DEVNULL,
                 stderr=subprocess.PIPE,
                 preexec_fn=os.setsid  # Create new process group for proper termination
             )
@@ -63,7 +64,7 @@ class RecordingService:
                 }
             else:
                 # Process failed to start
-                stdout, stderr = self.recording_process.communicate()
+                _, stderr = self.recording_process.communicate()
                 error_msg = stderr.decode() if stderr else "Unknown error"
                 logger.error(f"❌ Recording failed to start: {error_msg}")
                 self._cleanup_recording()
@@ -95,8 +96,8 @@ class RecordingService:
                     self.recording_process.wait()
             
             # Check if recording file was created and has content
-            if self.recording_file and os.path.exists(self.recording_file):
-                file_size = os.path.getsize(self.recording_file)
+            file_size = self._recording_file_size()
+            if file_size is not None:
                 if file_size > 0:
                     logger.info(f"✅ Recording stopped. File: {self.recording_file} ({file_size} bytes)")
                     
@@ -127,6 +128,15 @@ class RecordingService:
             self._cleanup_recording()
             return {"success": False, "error": str(e)}
     
+    def _recording_file_size(self) -> Optional[int]:
+        """Size of the recording file from a single stat, or None if it is missing"""
+        if not self.recording_file:
+            return None
+        try:
+            return os.stat(self.recording_file).st_size
+        except FileNotFoundError:
+            return None
+    
     def _cleanup_recording(self):
         """Clean up recording resources"""
         self.is_recording = False
@@ -179,8 +189,8 @@ class RecordingService:
                         logger.info("Recording process stopped gracefully")
                         
                         # Check if file was created
-                        if self.recording_file and os.path.exists(self.recording_file):
-                            file_size = os.path.getsize(self.recording_file)
+                        file_size = self._recording_file_size()
+                        if file_size is not None:
                             if file_size > 0:
                                 # Move file to user's Downloads folder
                                 try:
@@ -1,59 +1,100 @@
 import subprocess
-import tempfile
-import os
-import base64
-from PIL import Image
-import io
-from typing import Optional, Dict
+import threading
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+import cv2
+import numpy as np
+from typing import Optional, Dict, Tuple
 from app.config.settings import settings
 from app.core.logging import logger
 from app.utils.image_utils import ImageUtils
-from app.utils.system_utils import SystemUtils
 
 class ScreenshotService:
     """Service for screenshot capture with dynamic UDID support"""
     
+    # Captures currently running, shared by every instance: (udid, quality) -> result future
+    _in_flight: Dict[Tuple[str, int], Future] = {}
+    _in_flight_lock = threading.Lock()
+    
     def __init__(self, udid: Optional[str] = None):
         self.udid = udid
+        # (quality, PNG from idb, encoded screenshot) of the last capture
+        self._last_capture: Tuple[Optional[int], bytes, Optional[Dict[str, any]]] = (None, b"", None)
     
     def set_udid(self, udid: str):
         """Set the UDID for this service instance"""
         self.udid = udid
+        self._last_capture = (None, b"", None)
     
-    def capture_screenshot(self, quality: int = None) -> Optional[Dict[str, any]]:
-        """Capture device screenshot"""
+    def capture_screenshot(self, quality: int = None, include_base64: bool = True) -> Optional[Dict[str, any]]:
+        """Capture device screenshot; binary consumers can skip the base64 copy"""
         if not self.udid:
             logger.error("No UDID set for screenshot capture")
             return None
             
         if quality is None:
             quality = settings.DEFAULT_JPEG_QUALITY
-            
+        
+        # Concurrent callers for the same device and quality share one idb invocation
+        key = (self.udid, quality)
+        with ScreenshotService._in_flight_lock:
+            pending = ScreenshotService._in_flight.get(key)
+            is_leader = pending is None
+            if is_leader:
+                pending = ScreenshotService._in_flight[key] = Future()
+        
+        if is_leader:
+            try:
+                screenshot = self._capture_jpeg(quality)
+            except BaseException as e:
+                pending.set_exception(e)
+                raise
+            else:
+                pending.set_result(screenshot)
+            finally:
+                with ScreenshotService._in_flight_lock:
+                    ScreenshotService._in_flight.pop(key, None)
+        else:
+            try:
+                screenshot = pending.result(timeout=settings.SCREENSHOT_TIMEOUT + 1)
+            except FuturesTimeoutError:
+                logger.warning("Timed out waiting for in-flight screenshot")
+                return None
+        
+        if screenshot is None:
+            return None
+        if include_base64 and "data" not in screenshot:
+            screenshot["data"] = ImageUtils.b64encode_str(screenshot["bytes"])
+        return dict(screenshot)  # Callers tag frames in place
+    
+    def _capture_jpeg(self, quality: int) -> Optional[Dict[str, any]]:
+        """Fetch a PNG from idb and encode it to JPEG"""
         try:
-            with SystemUtils.create_temp_file('.png') as temp_file:
-                cmd = ["idb", "screenshot", "--udid", self.udid, temp_file.name]
-                result = subprocess.run(
-                    cmd, capture_output=True, 
-                    timeout=settings.SCREENSHOT_TIMEOUT
-                )
+            # "-" makes idb write the PNG to stdout, so it never touches disk
+            cmd = [settings.IDB_PATH, "screenshot", "--udid", self.udid, "-"]
+            result = subprocess.run(
+                cmd, capture_output=True, 
+                timeout=settings.SCREENSHOT_TIMEOUT
+            )
+            
+            if result.returncode == 0 and result.stdout:
+                png_data = result.stdout
+                last_quality, last_png, screenshot = self._last_capture
                 
-                if result.returncode == 0 and os.path.exists(temp_file.name):
-                    with Image.open(temp_file.name) as img:
-                        if img.mode != 'RGB':
-                            img = img.convert('RGB')
-                        
-                        # Convert to JPEG
-                        output = io.BytesIO()
-                        img.save(output, format='JPEG', quality=quality, optimize=True)
-                        image_data = output.getvalue()
+                # A static screen yields a bit-identical PNG; reuse the JPEG (and base64) built for it
+                if quality != last_quality or png_data != last_png:
+                    bgr = cv2.imdecode(np.frombuffer(png_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                    if bgr is None:
+                        return None
                     
-                    SystemUtils.cleanup_temp_file(temp_file.name)
-                    
-                    return {
-                        "data": base64.b64encode(image_data).decode('utf-8'),
-                        "pixel_width": img.width,
-                        "pixel_height": img.height
+                    pixel_height, pixel_width = bgr.shape[:2]
+                    screenshot = {
+                        "bytes": ImageUtils.encode_jpeg(bgr, quality),
+                        "pixel_width": pixel_width,
+                        "pixel_height": pixel_height
                     }
+                    self._last_capture = (quality, png_data, screenshot)
+                
+                return screenshot
                     
         except subprocess.TimeoutExpired:
             logger.debug(f"Screenshot timeout for UDID: {self.udid}")
@@ -62,10 +103,10 @@ class ScreenshotService:
         
         return None
     
-    def capture_ultra_fast_screenshot(self) -> Optional[Dict[str, any]]:
+    def capture_ultra_fast_screenshot(self, include_base64: bool = True) -> Optional[Dict[str, any]]:
         """Ultra-fast screenshot for real-time streaming"""
-        return self.capture_screenshot(quality=settings.DEFAULT_JPEG_QUALITY)
+        return self.capture_screenshot(quality=settings.DEFAULT_JPEG_QUALITY, include_base64=include_base64)
     
-    def capture_high_quality_screenshot(self) -> Optional[Dict[str, any]]:
+    def capture_high_quality_screenshot(self, include_base64: bool = True) -> Optional[Dict[str, any]]:
         """High-quality screenshot"""
-        return self.capture_screenshot(quality=settings.WEBRTC_HIGH_QUALITY)
\ No newline at end of file
+        return self.capture_screenshot(quality=settings.WEBRTC_HIGH_QUALITY, include_base64=include_base64)
\ No newline at end of file
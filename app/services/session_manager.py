@@ -1,5 +1,7 @@
 import json
 import os
+import re
+import subprocess
 import time
 from typing import Dict, Optional, List, Tuple
 from pathlib import Path
@@ -9,6 +11,14 @@ from app.services.ios_sim_manager_service import iOSSimulatorManager, SimulatorS
 from app.core.logging import logger
 from app.config.settings import settings
 
+# `idb describe` parsers, compiled once
+_SCREEN_POINTS_RE = re.compile(r'screen_dimensions=ScreenDimensions\([^)]+width_points=(\d+)[^)]+height_points=(\d+)')
+_POINTS_RE = re.compile(r'width_points=(\d+).*?height_points=(\d+)', re.S)
+_SCREEN_PIXELS_RE = re.compile(r'screen_dimensions=ScreenDimensions\([^)]*width=(\d+),\s*height=(\d+)')
+_PIXELS_RE = re.compile(r'width=(\d+).*?height=(\d+)', re.S)
+_IPHONE_MODEL_RE = re.compile(r'iPhone\s+[\w\s]*\d+[\w\s]*')
+_IPAD_MODEL_RE = re.compile(r'iPad[\w\s]*')
+
 class SessionManager:
     """Centralized session management with persistent storage"""
     
@@ -151,16 +161,14 @@ class SessionManager:
             # Check for common device patterns
             if 'iPhone' in name:
                 # Try to extract iPhone model
-                import re
                 # Look for patterns like "iPhone 15", "iPhone 16 Pro", etc.
-                match = re.search(r'iPhone\s+[\w\s]*\d+[\w\s]*', name)
+                match = _IPHONE_MODEL_RE.search(name)
                 if match:
                     return match.group().strip()
                 return "iPhone"
             elif 'iPad' in name:
                 # Try to extract iPad model
-                import re
-                match = re.search(r'iPad[\w\s]*', name)
+                match = _IPAD_MODEL_RE.search(name)
                 if match:
                     return match.group().strip()
                 return "iPad"
@@ -434,16 +442,13 @@ class SessionManager:
     def _get_device_dimensions_sync(self, udid: str) -> Tuple[int, int]:
         """Get device logical point dimensions synchronously (width_points, height_points)."""
         try:
-            import subprocess
-            import re
-            
-            cmd = ["idb", "describe", "--udid", udid]
+            cmd = [settings.IDB_PATH, "describe", "--udid", udid]
             result = subprocess.run(cmd, capture_output=True, text=True, timeout=3)
             
             if result.returncode == 0:
                 # Parse the screen_dimensions from the output
                 # Format: screen_dimensions=ScreenDimensions(width=1179, height=2556, density=3.0, width_points=393, height_points=852)
-                screen_dims_match = re.search(r'screen_dimensions=ScreenDimensions\([^)]+width_points=(\d+)[^)]+height_points=(\d+)', result.stdout)
+                screen_dims_match = _SCREEN_POINTS_RE.search(result.stdout)
                 
                 if screen_dims_match:
                     width_points = int(screen_dims_match.group(1))
@@ -452,12 +457,11 @@ class SessionManager:
                     return (width_points, height_points)
                 
                 # Fallback: try original regex patterns
-                width_points_match = re.search(r'width_points=(\d+)', result.stdout)
-                height_points_match = re.search(r'height_points=(\d+)', result.stdout)
+                points_match = _POINTS_RE.search(result.stdout)
                 
-                if width_points_match and height_points_match:
-                    width_points = int(width_points_match.group(1))
-                    height_points = int(height_points_match.group(1))
+                if points_match:
+                    width_points = int(points_match.group(1))
+                    height_points = int(points_match.group(2))
                     logger.info(f"Device {udid} fallback point dimensions: {width_points}x{height_points} (logical points)")
                     return (width_points, height_points)
                 
@@ -470,25 +474,22 @@ class SessionManager:
     def _get_stream_dimensions_sync(self, udid: str) -> Optional[Tuple[int, int]]:
         """Get the raw stream pixel dimensions (width, height) via idb describe."""
         try:
-            import subprocess
-            import re
-            cmd = ["idb", "describe", "--udid", udid]
+            cmd = [settings.IDB_PATH, "describe", "--udid", udid]
             result = subprocess.run(cmd, capture_output=True, text=True, timeout=3)
             if result.returncode == 0:
                 # Look for width and height in pixels within ScreenDimensions
                 # Example: ScreenDimensions(width=1179, height=2556, density=3.0, width_points=393, height_points=852)
-                px_match = re.search(r'screen_dimensions=ScreenDimensions\([^)]*width=(\d+),\s*height=(\d+)', result.stdout)
+                px_match = _SCREEN_PIXELS_RE.search(result.stdout)
                 if px_match:
                     width_px = int(px_match.group(1))
                     height_px = int(px_match.group(2))
                     logger.info(f"Stream pixel dimensions for {udid}: {width_px}x{height_px}")
                     return (width_px, height_px)
                 # Fallback: try separate matches
-                width_px_match = re.search(r'width=(\d+)', result.stdout)
-                height_px_match = re.search(r'height=(\d+)', result.stdout)
-                if width_px_match and height_px_match:
-                    width_px = int(width_px_match.group(1))
-                    height_px = int(height_px_match.group(1))
+                px_fallback_match = _PIXELS_RE.search(result.stdout)
+                if px_fallback_match:
+                    width_px = int(px_fallback_match.group(1))
+                    height_px = int(px_fallback_match.group(2))
                     logger.info(f"Stream pixel dimensions (fallback) for {udid}: {width_px}x{height_px}")
                     return (width_px, height_px)
         except Exception as e:
@@ -1,33 +1,48 @@
+import asyncio
 import threading
+import struct
 import time
 import subprocess
-import queue
-from typing import List, Optional, Dict
-from queue import Queue, Empty
+from collections import deque
+from typing import Any, Optional, Dict, Set, Tuple
 from app.config.settings import settings
 from app.core.logging import logger
+from app.models.responses import VideoFrame
+from app.services.device_service import DeviceService
 from app.services.screenshot_service import ScreenshotService
+from app.utils.image_utils import IMAGE_EXECUTOR, ImageUtils
 from app.utils.system_utils import SystemUtils
 
+# Binary frame prefix: header length, image length (uint32, little endian)
+_BINARY_FRAME_PREFIX = struct.Struct("<II")
+
 class VideoService:
     """Service for video streaming with dynamic UDID support"""
     
     def __init__(self, udid: Optional[str] = None):
         self.udid = udid
         self.screenshot_service = ScreenshotService(udid)
+        self.device_service = DeviceService(udid)
         
         # Video streaming state
-        self.video_clients: List[any] = []
-        self.video_frame_queue = Queue(maxsize=settings.VIDEO_QUEUE_SIZE)
+        self.video_clients: Dict[Any, asyncio.Queue] = {}  # client -> payloads waiting to be sent
+        self.binary_video_clients: Set[Any] = set()  # Subset receiving binary frames
+        self.video_frame_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.VIDEO_QUEUE_SIZE)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.dropped_frames = 0
+        self.client_dropped_frames: Dict[Any, int] = {}  # client -> payloads discarded for being slow
         self.video_streaming_active = False
         self.video_capture_process = None
         self.video_capture_thread = None
         self.video_lock = threading.Lock()
+        self._broadcast_task: Optional[asyncio.Task] = None
+        self._last_base64: Tuple[bytes, str] = (b"", "")  # Last JPEG and its base64 for text clients
     
     def set_udid(self, udid: str):
         """Set the UDID for this service instance"""
         self.udid = udid
         self.screenshot_service.set_udid(udid)
+        self.device_service.set_udid(udid)
     
     def start_video_capture(self) -> bool:
         """Start video capture"""
@@ -41,6 +56,12 @@ class VideoService:
             
             logger.info(f"Starting video capture for UDID: {self.udid}")
             
+            # Frames are handed from the capture thread to the event loop's queue
+            try:
+                self._loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._loop = None
+            
             # Try different capture methods
             if self._try_idb_video_stream():
                 return True
@@ -57,10 +78,11 @@ class VideoService:
         try:
             logger.info(f"Attempting idb video-stream for {self.udid}...")
             cmd = [
-                "idb", "video-stream",
+                settings.IDB_PATH, "video-stream",
                 "--udid", self.udid,
-                "--format", "h264",
-                "--fps", "60"
+                "--format", "mjpeg",
+                "--fps", str(settings.DEFAULT_VIDEO_FPS),
+                "--compression-quality", str(settings.DEFAULT_JPEG_QUALITY / 100)
             ]
             
             self.video_capture_process = subprocess.Popen(
@@ -71,7 +93,7 @@ class VideoService:
             if self.video_capture_process.poll() is None:
                 self.video_streaming_active = True
                 self.video_capture_thread = threading.Thread(
-                    target=self._process_idb_video_stream, daemon=True
+                    target=self._process_mjpeg_stream, daemon=True
                 )
                 self.video_capture_thread.start()
                 logger.info(f"✅ idb video-stream started successfully for {self.udid}")
@@ -192,41 +214,20 @@ class VideoService:
         self.video_capture_thread.start()
         return True
     
-    def _process_idb_video_stream(self):
-        """Process idb video stream"""
-        logger.info(f"Processing idb video stream for {self.udid}...")
-        while self.video_streaming_active and self.video_capture_process:
-            try:
-                # For now, fall back to screenshot method for simplicity
-                screenshot_data = self.screenshot_service.capture_ultra_fast_screenshot()
-                if screenshot_data:
-                    self._enqueue_frame({
-                        "data": screenshot_data["data"],
-                        "timestamp": time.time(),
-                        "format": "jpeg",
-                        "pixel_width": screenshot_data.get("pixel_width", 390),
-                        "pixel_height": screenshot_data.get("pixel_height", 844)
-                    })
-                time.sleep(1/60)
-            except Exception as e:
-                logger.error(f"idb stream processing error for {self.udid}: {e}")
-                break
-    
     def _process_h264_stream(self):
         """Process H.264 stream from FFmpeg"""
         logger.info(f"Processing H.264 stream for {self.udid}...")
         frame_count = 0
+        capture = self.screenshot_service.capture_ultra_fast_screenshot
+        now = time.time
         while self.video_streaming_active and self.video_capture_process:
             try:
-                screenshot_data = self.screenshot_service.capture_ultra_fast_screenshot()
+                screenshot_data = capture(include_base64=False)
                 if screenshot_data:
-                    self._enqueue_frame({
-                        "data": screenshot_data["data"],
-                        "timestamp": time.time(),
-                        "format": "jpeg",
-                        "pixel_width": screenshot_data.get("pixel_width", 390),
-                        "pixel_height": screenshot_data.get("pixel_height", 844)
-                    })
+                    # The screenshot dict already carries bytes and pixel size; reuse it as the frame
+                    screenshot_data["timestamp"] = now()
+                    screenshot_data["format"] = "jpeg"
+                    self._enqueue_frame(screenshot_data)
                 
                 frame_count += 1
                 time.sleep(1/45)
@@ -235,39 +236,56 @@ class VideoService:
                 break
     
     def _process_mjpeg_stream(self):
-        """Process MJPEG stream from FFmpeg"""
+        """Process MJPEG stream from idb or FFmpeg"""
         logger.info(f"Processing MJPEG stream for {self.udid}...")
-        buffer = b""
+        # One growable buffer and one read chunk are reused for the whole stream; the
+        # chunk matches the default pipe capacity so each read drains what is ready
+        buffer = bytearray()
+        chunk = bytearray(65536)
+        # Once a frame's start marker is found it sits at buffer[0]; the end-marker
+        # search resumes where the previous read left off instead of rescanning
+        in_frame = False
+        search_from = 0
         
         while self.video_streaming_active and self.video_capture_process:
             try:
-                chunk = self.video_capture_process.stdout.read(8192)
-                if not chunk:
+                size = self.video_capture_process.stdout.readinto(chunk)
+                if not size:
                     break
                 
-                buffer += chunk
+                buffer += memoryview(chunk)[:size]
                 
                 # Look for JPEG boundaries
-                while b'\xff\xd8' in buffer and b'\xff\xd9' in buffer:
-                    start = buffer.find(b'\xff\xd8')
-                    end = buffer.find(b'\xff\xd9', start) + 2
+                while True:
+                    if not in_frame:
+                        start = buffer.find(b'\xff\xd8')
+                        if start == -1:
+                            del buffer[:-1]  # May hold the first byte of a split marker
+                            break
+                        del buffer[:start]
+                        in_frame = True
+                        search_from = 2
                     
-                    if start != -1 and end > start:
-                        jpeg_data = buffer[start:end]
-                        buffer = buffer[end:]
-                        
-                        import base64
-                        frame_b64 = base64.b64encode(jpeg_data).decode('utf-8')
-                        
-                        self._enqueue_frame({
-                            "data": frame_b64,
-                            "timestamp": time.time(),
-                            "format": "jpeg",
-                            "pixel_width": 390,
-                            "pixel_height": 844
-                        })
-                    else:
+                    end = buffer.find(b'\xff\xd9', search_from)
+                    if end == -1:
+                        search_from = max(2, len(buffer) - 1)  # Marker may straddle reads
                         break
+                    
+                    # Copy the frame out once; it outlives the buffer in client queues
+                    with memoryview(buffer) as view:
+                        jpeg_data = view[:end + 2].tobytes()
+                    del buffer[:end + 2]
+                    in_frame = False
+                    
+                    pixel_width, pixel_height = ImageUtils.get_jpeg_dimensions(jpeg_data) or (390, 844)
+                    
+                    self._enqueue_frame({
+                        "bytes": jpeg_data,
+                        "timestamp": time.time(),
+                        "format": "jpeg",
+                        "pixel_width": pixel_width,
+                        "pixel_height": pixel_height
+                    })
                         
             except Exception as e:
                 logger.error(f"MJPEG processing error for {self.udid}: {e}")
@@ -278,55 +296,77 @@ class VideoService:
         logger.info(f"Starting ultra high-FPS screenshot mode for {self.udid}...")
         
         target_fps = settings.DEFAULT_VIDEO_FPS
-        frame_interval = 1.0 / target_fps
-        last_capture = 0
+        # Pace on the monotonic clock so wall-clock adjustments can't stall or burst capture
+        frame_interval_ns = 1_000_000_000 // target_fps
+        last_capture_ns = -frame_interval_ns
+        # Static screens back off toward this interval and snap back on the first change
+        capture_interval_ns = frame_interval_ns
+        idle_interval_ns = int(settings.SCREENSHOT_IDLE_MAX_INTERVAL * 1_000_000_000)
+        last_image = None
         frame_count = 0
+        capture = self.screenshot_service.capture_ultra_fast_screenshot
+        now_ns = time.monotonic_ns
         
         while self.video_streaming_active:
-            current_time = time.time()
+            current_ns = now_ns()
             
-            if current_time - last_capture >= frame_interval:
+            if current_ns - last_capture_ns >= capture_interval_ns:
                 try:
-                    screenshot_data = self.screenshot_service.capture_ultra_fast_screenshot()
+                    screenshot_data = capture(include_base64=False)
                     if screenshot_data:
-                        self._enqueue_frame({
-                            "data": screenshot_data["data"],
-                            "timestamp": current_time,
-                            "format": "jpeg",
-                            "pixel_width": screenshot_data.get("pixel_width", 390),
-                            "pixel_height": screenshot_data.get("pixel_height", 844)
-                        })
+                        # ScreenshotService hands back the same bytes object for an unchanged screen
+                        if screenshot_data["bytes"] is last_image:
+                            capture_interval_ns = min(capture_interval_ns * 3 // 2, idle_interval_ns)
+                        else:
+                            capture_interval_ns = frame_interval_ns
+                            last_image = screenshot_data["bytes"]
+                        
+                        screenshot_data["timestamp"] = time.time()
+                        screenshot_data["format"] = "jpeg"
+                        self._enqueue_frame(screenshot_data)
                         
                         frame_count += 1
                         if frame_count % 120 == 0:
                             logger.info(f"Screenshot mode for {self.udid}: {frame_count} frames captured")
                     
-                    last_capture = current_time
+                    last_capture_ns = current_ns
                     
                 except Exception as e:
                     logger.error(f"Screenshot error for {self.udid}: {e}")
                     time.sleep(0.1)
             else:
-                sleep_time = frame_interval - (current_time - last_capture)
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
+                time.sleep((capture_interval_ns - (current_ns - last_capture_ns)) / 1_000_000_000)
     
     def _enqueue_frame(self, frame_data: Dict):
-        """Add frame to queue with overflow handling"""
+        """Hand frame from the capture thread over to the event loop"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
         try:
-            self.video_frame_queue.put_nowait(frame_data)
-        except queue.Full:
+            loop.call_soon_threadsafe(self._put_frame, frame_data)
+        except RuntimeError:
+            pass  # Event loop is shutting down
+    
+    def _put_frame(self, frame_data: Dict):
+        """Add frame to queue, dropping the oldest ones once the consumer falls behind (runs on the event loop)"""
+        # Video is lossy: keep latency bounded by never letting stale frames pile up
+        while self.video_frame_queue.qsize() >= settings.VIDEO_BACKPRESSURE_THRESHOLD:
             try:
                 self.video_frame_queue.get_nowait()
-                self.video_frame_queue.put_nowait(frame_data)
-            except queue.Empty:
-                pass
+                self.dropped_frames += 1
+            except asyncio.QueueEmpty:
+                break
+        
+        try:
+            self.video_frame_queue.put_nowait(frame_data)
+        except asyncio.QueueFull:
+            self.dropped_frames += 1
     
-    def get_frame(self, timeout: float = 0.05) -> Optional[Dict]:
-        """Get next frame from queue"""
+    async def get_frame(self, timeout: float = 1.0) -> Optional[Dict]:
+        """Wait for the next frame without blocking the event loop"""
         try:
-            return self.video_frame_queue.get(timeout=timeout)
-        except Empty:
+            return await asyncio.wait_for(self.video_frame_queue.get(), timeout)
+        except asyncio.TimeoutError:
             return None
     
     def stop_video_capture(self):
@@ -355,29 +395,153 @@ class VideoService:
         while not self.video_frame_queue.empty():
             try:
                 self.video_frame_queue.get_nowait()
-            except Empty:
+            except asyncio.QueueEmpty:
                 break
     
-    def add_client(self, client):
-        """Add video client"""
-        self.video_clients.append(client)
+    def add_client(self, client, binary: bool = False) -> asyncio.Queue:
+        """Add video client, optionally receiving binary frames
+        
+        Returns the client's bounded payload queue; the caller sends what it yields.
+        """
+        payloads = asyncio.Queue(maxsize=settings.VIDEO_CLIENT_QUEUE_SIZE)
+        self.video_clients[client] = payloads
+        self.client_dropped_frames[client] = 0
+        if binary:
+            self.binary_video_clients.add(client)
         if not self.video_streaming_active:
             self.start_video_capture()
+        
+        if self._broadcast_task is None or self._broadcast_task.done():
+            try:
+                self._broadcast_task = asyncio.create_task(self._broadcast_frames())
+            except RuntimeError:
+                logger.warning(f"Cannot start video broadcast for {self.udid} - no event loop running")
+        
+        return payloads
     
     def remove_client(self, client):
         """Remove video client"""
-        if client in self.video_clients:
-            self.video_clients.remove(client)
+        self.video_clients.pop(client, None)
+        self.binary_video_clients.discard(client)
+        self.client_dropped_frames.pop(client, None)
         
         if not self.video_clients:
+            if self._broadcast_task:
+                self._broadcast_task.cancel()
+                self._broadcast_task = None
             self.stop_video_capture()
     
+    async def _broadcast_frames(self):
+        """Encode each captured frame once and hand the payload to every client's queue"""
+        try:
+            frame_count = 0
+            fps_counter = deque()
+            point_width, point_height = await self.device_service.get_point_dimensions()
+            loop = asyncio.get_running_loop()
+            envelope_key = None
+            envelope_head = ""
+            
+            while self.video_clients:
+                frame_data = await self.get_frame()
+                if not frame_data or not self.video_clients:
+                    continue
+                
+                frame_count += 1
+                current_ns = time.monotonic_ns()
+                
+                # Calculate FPS: frames seen in the last second, integer nanosecond compare
+                fps_counter.append(current_ns)
+                while current_ns - fps_counter[0] >= 1_000_000_000:
+                    fps_counter.popleft()
+                
+                # Constant fields only change with rotation or capture method
+                pixel_width = frame_data.get("pixel_width", 390)
+                pixel_height = frame_data.get("pixel_height", 844)
+                frame_format = frame_data.get("format", "jpeg")
+                if envelope_key != (pixel_width, pixel_height, frame_format):
+                    envelope_key = (pixel_width, pixel_height, frame_format)
+                    envelope_head = self._frame_envelope_head(
+                        pixel_width=pixel_width,
+                        pixel_height=pixel_height,
+                        point_width=point_width,
+                        point_height=point_height,
+                        format=frame_format
+                    )
+                envelope_tail = (
+                    f'"frame":{frame_count},"timestamp":{frame_data["timestamp"]!r},'
+                    f'"fps":{len(fps_counter)}}}'
+                )
+                
+                binary_count = len(self.binary_video_clients)
+                
+                # Payload assembly copies the whole frame; do it on the image pool
+                text_payload, binary_payload = await loop.run_in_executor(
+                    IMAGE_EXECUTOR, self._build_payloads, frame_data, envelope_head, envelope_tail,
+                    binary_count < len(self.video_clients), binary_count > 0
+                )
+                
+                # Each client sends at its own pace; a slow one only loses its own oldest frames
+                for client, payloads in list(self.video_clients.items()):
+                    payload = binary_payload if client in self.binary_video_clients else text_payload
+                    if payload is None:
+                        continue  # Client joined while this frame was being built
+                    if payloads.full():
+                        payloads.get_nowait()
+                        dropped = self.client_dropped_frames.get(client, 0) + 1
+                        self.client_dropped_frames[client] = dropped
+                        if dropped % 100 == 0:
+                            logger.info(f"🐢 Slow video client for {self.udid}: {dropped} frames dropped")
+                    payloads.put_nowait(payload)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Video broadcast error for {self.udid}: {e}")
+    
+    @staticmethod
+    def _frame_envelope_head(**constant_fields) -> str:
+        """Serialize the constant VideoFrame fields once, leaving the JSON object open
+
+        Only data, frame, timestamp and fps vary per frame; they are appended
+        after this head. Base64 data never needs JSON escaping.
+        """
+        envelope = VideoFrame(data="", frame=0, timestamp=0.0, fps=0, **constant_fields)
+        constant_json = envelope.model_dump_json(exclude={"data", "frame", "timestamp", "fps"})
+        return constant_json[:-1]
+    
+    def _build_payloads(self, frame_data: Dict, envelope_head: str, envelope_tail: str,
+                        need_text: bool, need_binary: bool) -> Tuple[Optional[str], Optional[bytes]]:
+        """Assemble the JSON and/or binary payload for one frame (runs on the image pool)"""
+        text_payload = None
+        binary_payload = None
+        if need_text:
+            image = frame_data["bytes"]
+            last_image, data = self._last_base64
+            if image != last_image:  # Unchanged screen: reuse the previous frame's base64
+                data = ImageUtils.b64encode_str(image)
+                self._last_base64 = (image, data)
+            text_payload = f'{envelope_head},"data":"{data}",{envelope_tail}'
+        if need_binary:
+            header = f'{envelope_head},{envelope_tail}'.encode()
+            binary_payload = self._pack_binary_frame(header, frame_data["bytes"])
+        return text_payload, binary_payload
+    
+    @staticmethod
+    def _pack_binary_frame(header: bytes, image: bytes) -> bytes:
+        """Pack a binary frame, shared read-only by every binary client
+
+        Layout: uint32 header length, uint32 image length (little endian),
+        the JSON header (VideoFrame without data), then the raw image bytes.
+        """
+        return b"".join((_BINARY_FRAME_PREFIX.pack(len(header), len(image)), header, image))
+    
     def get_status(self) -> Dict:
         """Get video service status"""
         return {
             "video_streaming": self.video_streaming_active,
             "video_clients": len(self.video_clients),
             "queue_size": self.video_frame_queue.qsize(),
+            "dropped_frames": self.dropped_frames,
+            "client_dropped_frames": sum(self.client_dropped_frames.values()),
             "capture_method": "hardware" if self.video_capture_process else "screenshots",
             "udid": self.udid
         }
\ No newline at end of file
@@ -0,0 +1,103 @@
+import asyncio
+from collections import deque
+from typing import Optional
+import av
+from aiortc.contrib.media import MediaRelay
+
+from app.core.logging import logger
+
+class RelayedTrackMixin:
+    """Shared source track and peer connection teardown for the WebRTC services"""
+    
+    # VideoStreamTrack subclass built as the stream's single source
+    track_class = None
+    
+    def _init_relay(self):
+        """Set up the relay state; call from __init__"""
+        self._close_tasks = set()  # Keeps close tasks referenced until they finish
+        # Shared source track for the current stream, fanned out to peers by the relay
+        self._relay = MediaRelay()
+        self._video_track = None
+    
+    def _get_video_track(self):
+        """Return the stream's source track, creating it on first use"""
+        if self._video_track is None:
+            self._video_track = self.track_class(self, target_fps=self.target_fps)
+        return self._video_track
+    
+    def _stop_track_and_peers(self):
+        """End the source track and close every peer connection"""
+        # The relay stops reading a stopped track
+        if self._video_track is not None:
+            self._video_track.stop()
+            self._video_track = None
+        
+        # Close all peer connections together in one tracked task
+        connections_to_close = list(self.peer_connections.items())
+        self.peer_connections.clear()
+        
+        if connections_to_close:
+            try:
+                task = asyncio.create_task(self._close_connections(connections_to_close))
+            except RuntimeError as e:  # No running event loop
+                logger.debug(f"Error closing connections: {e}")
+            else:
+                self._close_tasks.add(task)
+                task.add_done_callback(self._close_tasks.discard)
+    
+    async def _close_connections(self, connections):
+        """Close peer connections concurrently, logging any that fail"""
+        results = await asyncio.gather(*(pc.close() for _, pc in connections), return_exceptions=True)
+        for (connection_id, _), result in zip(connections, results):
+            if isinstance(result, Exception):
+                logger.debug(f"Error closing connection {connection_id}: {result}")
+
+class LatestFrameMixin:
+    """Single-frame slot filled by a producer thread and drained by the track"""
+    
+    def _init_latest_frame(self):
+        """Set up the frame slot; call from __init__"""
+        # Appending drops the older frame, so the track always gets the freshest one
+        self._latest_frames = deque(maxlen=1)
+        # Set on the event loop when a frame is published; see _notify_frame
+        self._frame_event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def _publish_frame(self, av_frame: av.VideoFrame):
+        """Replace the queued frame and wake the waiting track (any thread)"""
+        self._latest_frames.append(av_frame)
+        loop = self._loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self._notify_frame)
+            except RuntimeError:
+                pass  # Event loop closed
+    
+    def _take_frame(self) -> Optional[av.VideoFrame]:
+        """Pop the queued frame, if any"""
+        try:
+            return self._latest_frames.popleft()
+        except IndexError:
+            return None
+    
+    def _notify_frame(self):
+        """Wake the track waiting for a new frame (runs on the event loop)"""
+        if self._frame_event is not None:
+            self._frame_event.set()
+            self._frame_event = None
+    
+    async def _wait_for_frame(self, timeout: float) -> Optional[av.VideoFrame]:
+        """Take the queued frame, waiting up to timeout for one"""
+        self._loop = asyncio.get_running_loop()
+        frame = self._take_frame()
+        if frame is not None:
+            return frame
+        
+        # Wait on the loop itself; the producer thread wakes us via _notify_frame
+        if self._frame_event is None:
+            self._frame_event = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._frame_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return self._take_frame()
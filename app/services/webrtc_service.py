@@ -2,18 +2,18 @@ import threading
 import time
 import asyncio
 import uuid
-import base64
 import io
 from typing import Dict, Optional
-from queue import Queue, Empty
 import av
 import numpy as np
 from PIL import Image
 from fractions import Fraction
 from aiortc import RTCPeerConnection, RTCSessionDescription, VideoStreamTrack, RTCIceCandidate
+from aiortc.mediastreams import MediaStreamError
 
 from app.core.logging import logger
 from app.services.screenshot_service import ScreenshotService
+from app.services.webrtc_common import RelayedTrackMixin, LatestFrameMixin
 
 class SimpleVideoTrack(VideoStreamTrack):
     """Stable video track with consistent frame timing to prevent flickering"""
@@ -26,10 +26,18 @@ class SimpleVideoTrack(VideoStreamTrack):
         self.frame_interval = 1.0 / target_fps
         self.start_time = time.time()
         self.last_frame = None
+        # Built once, used until the first real frame arrives
+        self._placeholder = av.VideoFrame.from_ndarray(
+            np.zeros((390, 844, 3), dtype=np.uint8),  # Fixed dimensions
+            format='rgb24'
+        )
         logger.info(f"🎬 VideoTrack initialized: {target_fps}fps, interval: {self.frame_interval:.3f}s")
     
     async def recv(self):
         """Generate stable video frames with consistent timing"""
+        if self.readyState != "live":
+            raise MediaStreamError
+        
         # Calculate target timestamp for this frame
         target_time = self.start_time + (self.frame_count * self.frame_interval)
         current_time = time.time()
@@ -44,17 +52,13 @@ class SimpleVideoTrack(VideoStreamTrack):
         
         # If no new frame available, reuse last frame to prevent flickering
         if frame is None and self.last_frame is not None:
-            # Create new frame from last frame's data
-            frame_array = self.last_frame.to_ndarray(format='rgb24')
-            frame = av.VideoFrame.from_ndarray(frame_array, format='rgb24')
+            # Re-send the last frame; only its timestamps change below
+            frame = self.last_frame
             logger.debug(f"🔄 Reusing last frame for WebRTC stability (frame {self.frame_count})")
         elif frame is None:
-            # Only create placeholder if we have no previous frame
-            frame = av.VideoFrame.from_ndarray(
-                np.zeros((390, 844, 3), dtype=np.uint8),  # Fixed dimensions
-                format='rgb24'
-            )
-            logger.debug(f"🖼️  Created placeholder frame {self.frame_count}")
+            # Only send the placeholder if we have no previous frame
+            frame = self._placeholder
+            logger.debug(f"🖼️  Sent placeholder frame {self.frame_count}")
         else:
             # Store this frame's data for potential reuse
             self.last_frame = frame
@@ -66,16 +70,18 @@ class SimpleVideoTrack(VideoStreamTrack):
         self.frame_count += 1
         return frame
 
-class SimpleWebRTCService:
+class SimpleWebRTCService(RelayedTrackMixin, LatestFrameMixin):
     """Simple WebRTC service using optimized screenshots for proven reliability"""
     
+    track_class = SimpleVideoTrack
+    
     def __init__(self, udid: Optional[str] = None):
         self.udid = udid
         
         # WebRTC state
         self.peer_connections: Dict[str, RTCPeerConnection] = {}
         self.stream_active = False
-        self.video_queue = Queue(maxsize=2)  # Minimal buffer to prevent stale frames
+        self._init_latest_frame()
         
         # Stream processing
         self.frame_thread = None
@@ -85,6 +91,8 @@ class SimpleWebRTCService:
         self.quality_preset = "high"  # Use high quality by default
         self.target_fps = 30  # Lower FPS for stability, reduces flickering
         
+        self._init_relay()
+        
     def set_udid(self, udid: str):
         """Set the UDID for this service instance"""
         self.udid = udid
@@ -150,15 +158,13 @@ class SimpleWebRTCService:
                 try:
                     # Capture screenshot based on quality
                     if self.quality_preset in ["ultra", "high"]:
-                        screenshot_data = screenshot_service.capture_high_quality_screenshot()
+                        screenshot_data = screenshot_service.capture_high_quality_screenshot(include_base64=False)
                     else:
-                        screenshot_data = screenshot_service.capture_ultra_fast_screenshot()
+                        screenshot_data = screenshot_service.capture_ultra_fast_screenshot(include_base64=False)
                     
-                    if screenshot_data and "data" in screenshot_data:
+                    if screenshot_data and "bytes" in screenshot_data:
                         # Decode and process image
-                        image_bytes = base64.b64decode(screenshot_data["data"])
-                        
-                        with Image.open(io.BytesIO(image_bytes)) as img:
+                        with Image.open(io.BytesIO(screenshot_data["bytes"])) as img:
                             if img.mode != 'RGB':
                                 img = img.convert('RGB')
                             
@@ -179,19 +185,9 @@ class SimpleWebRTCService:
                             # Create AV frame
                             rgb_frame = av.VideoFrame.from_ndarray(img_array, format='rgb24')
                             
-                            # Manage queue for consistent flow
-                            while not self.video_queue.empty():
-                                try:
-                                    self.video_queue.get_nowait()  # Remove old frames
-                                except:
-                                    break
-                            
-                            # Add new frame
-                            try:
-                                self.video_queue.put_nowait(rgb_frame)
-                                frame_count += 1
-                            except:
-                                logger.debug("Queue full, frame dropped")
+                            # Replace any unsent frame for consistent flow
+                            self._publish_frame(rgb_frame)
+                            frame_count += 1
                     
                     # Set next frame time
                     next_frame_time += frame_interval
@@ -203,7 +199,7 @@ class SimpleWebRTCService:
                     # Periodic logging
                     if current_time - last_log_time >= 15.0:
                         actual_fps = frame_count / (current_time - last_log_time) if (current_time - last_log_time) > 0 else 0
-                        logger.info(f"📊 WebRTC {self.udid}: {frame_count} frames, {actual_fps:.1f}fps actual, queue: {self.video_queue.qsize()}")
+                        logger.info(f"📊 WebRTC {self.udid}: {frame_count} frames, {actual_fps:.1f}fps actual, queue: {len(self._latest_frames)}")
                         last_log_time = current_time
                         frame_count = 0
                         
@@ -220,12 +216,7 @@ class SimpleWebRTCService:
     
     async def get_next_frame(self):
         """Get next frame from video queue with timeout"""
-        try:
-            # Shorter timeout to avoid frame staleness
-            frame = self.video_queue.get(timeout=0.05)
-            return frame
-        except Empty:
-            return None
+        return await self._wait_for_frame(0.05)
     
     def stop_video_stream(self):
         """Stop video streaming and cleanup"""
@@ -235,21 +226,9 @@ class SimpleWebRTCService:
             self.stream_active = False
             
             # Clear frame queue
-            while not self.video_queue.empty():
-                try:
-                    self.video_queue.get_nowait()
-                except Empty:
-                    break
-        
-        # Close all peer connections
-        connections_to_close = list(self.peer_connections.items())
-        self.peer_connections.clear()
+            self._take_frame()
         
-        for connection_id, pc in connections_to_close:
-            try:
-                asyncio.create_task(pc.close())
-            except Exception as e:
-                logger.debug(f"Error closing connection {connection_id}: {e}")
+        self._stop_track_and_peers()
     
     async def create_peer_connection(self) -> tuple[str, RTCPeerConnection]:
         """Create new WebRTC peer connection"""
@@ -260,9 +239,8 @@ class SimpleWebRTCService:
         connection_id = str(uuid.uuid4())
         pc = RTCPeerConnection()
         
-        # Add video track with stable FPS
-        video_track = SimpleVideoTrack(self, target_fps=self.target_fps)
-        pc.addTrack(video_track)
+        # Add video track with stable FPS; one source per stream, relayed so every peer gets every frame
+        pc.addTrack(self._relay.subscribe(self._get_video_track(), buffered=False))
         logger.info(f"📹 Added video track with {self.target_fps}fps for {self.udid}")
         
         @pc.on("connectionstatechange")
@@ -349,6 +327,6 @@ class SimpleWebRTCService:
             "connections": len(self.peer_connections),
             "quality": self.quality_preset,
             "fps": self.target_fps,
-            "queue_size": self.video_queue.qsize(),
+            "queue_size": len(self._latest_frames),
             "udid": self.udid
         }
\ No newline at end of file
@@ -1,11 +1,45 @@
 import base64
 import io
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import numpy as np
 import cv2
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 from app.core.logging import logger
 
+# libjpeg-turbo via PyTurboJPEG is optional; OpenCV's encoder is the fallback
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):  # Package or libturbojpeg missing
+    _turbo_jpeg = None
+
+# pybase64's SIMD encoder is optional; the stdlib encoder is the fallback
+try:
+    from pybase64 import b64encode_as_string as _b64encode_as_string
+except ImportError:
+    _b64encode_as_string = None
+
+# OpenCV decode flags that scale by 1/n inside libjpeg's IDCT
+_REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# JPEG marker fields, read in place without slicing
+_JPEG_SEGMENT_LENGTH = struct.Struct(">H")
+_JPEG_SOF_DIMENSIONS = struct.Struct(">HH")  # height, width
+
+# Shared pool for CPU-bound image decode/resize/encode, one worker per core since
+# libjpeg-turbo, OpenCV and Pillow release the GIL. Blocking idb calls belong on the
+# default executor (asyncio.to_thread) so they never hold an encode worker.
+# PyTurboJPEG creates a libjpeg handle per call, so one instance is safe across workers.
+IMAGE_EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="image")
+
 class ImageUtils:
     """Image processing utilities"""
     
@@ -18,12 +52,82 @@ class ImageUtils:
                     img = img.convert('RGB')
                 
                 output = io.BytesIO()
-                img.save(output, format='JPEG', quality=quality, optimize=True)
-                return base64.b64encode(output.getvalue()).decode('utf-8')
+                img.save(output, format='JPEG', quality=quality, subsampling=2)  # 4:2:0, single Huffman pass
+                return ImageUtils.b64encode_str(output.getvalue())
         except Exception as e:
             logger.error(f"Image encoding error: {e}")
             raise
     
+    @staticmethod
+    def b64encode_str(data: bytes) -> str:
+        """Base64-encode straight to str, skipping the intermediate bytes copy when pybase64 is available"""
+        if _b64encode_as_string is not None:
+            return _b64encode_as_string(data)
+        return base64.b64encode(data).decode('ascii')
+    
+    @staticmethod
+    def encode_jpeg(bgr: np.ndarray, quality: int = 80) -> bytes:
+        """Encode a BGR pixel array to JPEG, using libjpeg-turbo's SIMD encoder when available"""
+        if _turbo_jpeg is not None:
+            return _turbo_jpeg.encode(
+                bgr, quality=quality, pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420
+            )
+        
+        success, encoded = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not success:
+            raise ValueError("JPEG encoding failed")
+        return encoded.tobytes()
+    
+    @staticmethod
+    def get_jpeg_dimensions(jpeg_data: bytes) -> Optional[Tuple[int, int]]:
+        """Read (width, height) from a JPEG's SOF header without decoding it"""
+        offset = 2  # Skip SOI
+        size = len(jpeg_data)
+        while offset + 9 <= size:
+            if jpeg_data[offset] != 0xFF:
+                return None
+            marker = jpeg_data[offset + 1]
+            if marker == 0xFF:  # Fill byte
+                offset += 1
+                continue
+            # SOF0-SOF15, excluding DHT, JPG and DAC which share the range
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = _JPEG_SOF_DIMENSIONS.unpack_from(jpeg_data, offset + 5)
+                return width, height
+            segment_length = _JPEG_SEGMENT_LENGTH.unpack_from(jpeg_data, offset + 2)[0]
+            offset += 2 + segment_length
+        return None
+    
+    @staticmethod
+    def decode_jpeg_to_size(jpeg_data: bytes, width: int, height: int) -> np.ndarray:
+        """Decode a JPEG to a BGR array of the given size
+
+        Downscaling by 1/2, 1/4 or 1/8 happens inside libjpeg's IDCT, so the
+        full-resolution image is never materialized; any remaining step uses
+        OpenCV's vectorized INTER_AREA resize.
+        """
+        src_size = ImageUtils.get_jpeg_dimensions(jpeg_data)
+        denominator = 1
+        if src_size:
+            for candidate in (8, 4, 2):
+                if src_size[0] // candidate >= width and src_size[1] // candidate >= height:
+                    denominator = candidate
+                    break
+        
+        if _turbo_jpeg is not None:
+            bgr = _turbo_jpeg.decode(
+                jpeg_data, pixel_format=TJPF_BGR, scaling_factor=(1, denominator)
+            )
+        else:
+            flags = _REDUCED_DECODE_FLAGS[denominator]
+            bgr = cv2.imdecode(np.frombuffer(jpeg_data, dtype=np.uint8), flags)
+            if bgr is None:
+                raise ValueError("JPEG decoding failed")
+        
+        if bgr.shape[1] != width or bgr.shape[0] != height:
+            bgr = cv2.resize(bgr, (width, height), interpolation=cv2.INTER_AREA)
+        return bgr
+    
     @staticmethod
     def decode_base64_to_array(base64_data: str) -> np.ndarray:
         """Decode base64 image to numpy array"""
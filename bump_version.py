@@ -4,100 +4,136 @@ Version bumping script for iOS Bridge CLI release
 Automatically updates version numbers in all required files
 """
 
+import os
 import sys
 import json
+import tempfile
 import re
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable, List, Tuple
 
-def update_pyproject_toml(file_path: Path, new_version: str) -> bool:
+# Version patterns, compiled once
+_PYPROJECT_VERSION_RE = re.compile(r'version\s*=\s*"[^"]*"')
+_PYPROJECT_VERSION_CAP_RE = re.compile(r'version\s*=\s*"([^"]*)"')
+# Top-level key of the two-space-indented package.json
+_PKG_JSON_VERSION_RE = re.compile(r'^(  "version"\s*:\s*)"[^"]*"', re.MULTILINE)
+_WORKFLOW_DEFAULT_RE = re.compile(r"default:\s*['\"]v[^'\"]*['\"]")
+_DUNDER_VERSION_RE = re.compile(r'__version__\s*=\s*["\'][^"\']*["\']')
+_SEMVER_RE = re.compile(r'^\d+\.\d+\.\d+(-[a-zA-Z0-9]+(\.[a-zA-Z0-9]+)*)?$')
+
+def _atomic_write_text(file_path: Path, content: str) -> None:
+    """Replace a file's contents atomically, keeping its permissions"""
+    mode = file_path.stat().st_mode
+    fd, tmp_path = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content.encode())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _write_if_changed(file_path: Path, content: str, updated_content: str, log: Callable[[str], None] = print) -> bool:
+    """Write updated content, skipping the write when the file is already current"""
+    if updated_content == content:
+        log(f"✅ {file_path} already up to date")
+    else:
+        _atomic_write_text(file_path, updated_content)
+        log(f"✅ Updated {file_path}")
+    return True
+
+def update_pyproject_toml(file_path: Path, new_version: str, log: Callable[[str], None] = print) -> bool:
     """Update version in pyproject.toml"""
     try:
         content = file_path.read_text()
-        updated_content = re.sub(
-            r'version\s*=\s*"[^"]*"',
-            f'version = "{new_version}"',
-            content
-        )
-        file_path.write_text(updated_content)
-        print(f"✅ Updated {file_path}")
-        return True
+        updated_content = _PYPROJECT_VERSION_RE.sub(f'version = "{new_version}"', content)
+        return _write_if_changed(file_path, content, updated_content, log)
+    except FileNotFoundError:
+        log(f"   ⚠️  File not found")
+        return False
     except Exception as e:
-        print(f"❌ Failed to update {file_path}: {e}")
+        log(f"❌ Failed to update {file_path}: {e}")
         return False
 
-def update_package_json(file_path: Path, new_version: str) -> bool:
+def update_package_json(file_path: Path, new_version: str, log: Callable[[str], None] = print) -> bool:
     """Update version in package.json"""
     try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
-        data['version'] = new_version
+        content = file_path.read_text()
+        # Edit the version in place to keep the rest of the file untouched
+        updated_content, replaced = _PKG_JSON_VERSION_RE.subn(
+            rf'\g<1>"{new_version}"', content, count=1
+        )
         
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=2)
-            f.write('\n')  # Add trailing newline
+        if not replaced:
+            data = json.loads(content)
+            data['version'] = new_version
+            updated_content = json.dumps(data, indent=2) + '\n'  # Add trailing newline
         
-        print(f"✅ Updated {file_path}")
-        return True
+        return _write_if_changed(file_path, content, updated_content, log)
+    except FileNotFoundError:
+        log(f"   ⚠️  File not found")
+        return False
     except Exception as e:
-        print(f"❌ Failed to update {file_path}: {e}")
+        log(f"❌ Failed to update {file_path}: {e}")
         return False
 
-def update_github_workflow(file_path: Path, new_version: str) -> bool:
+def update_github_workflow(file_path: Path, new_version: str, log: Callable[[str], None] = print) -> bool:
     """Update default version in GitHub workflow"""
     try:
         content = file_path.read_text()
-        updated_content = re.sub(
-            r"default:\s*['\"]v[^'\"]*['\"]",
-            f"default: 'v{new_version}'",
-            content
-        )
-        file_path.write_text(updated_content)
-        print(f"✅ Updated {file_path}")
-        return True
+        updated_content = _WORKFLOW_DEFAULT_RE.sub(f"default: 'v{new_version}'", content)
+        return _write_if_changed(file_path, content, updated_content, log)
+    except FileNotFoundError:
+        log(f"   ⚠️  File not found")
+        return False
     except Exception as e:
-        print(f"❌ Failed to update {file_path}: {e}")
+        log(f"❌ Failed to update {file_path}: {e}")
         return False
 
-def update_version_file(file_path: Path, new_version: str) -> bool:
+def update_version_file(file_path: Path, new_version: str, log: Callable[[str], None] = print) -> bool:
     """Update version in __init__.py if it exists"""
     try:
-        if not file_path.exists():
+        try:
+            content = file_path.read_text()
+        except FileNotFoundError:
             # Create __init__.py with version if it doesn't exist
             file_path.write_text(f'__version__ = "{new_version}"\n')
-            print(f"✅ Created {file_path}")
+            log(f"✅ Created {file_path}")
             return True
         
-        content = file_path.read_text()
-        updated_content = re.sub(
-            r'__version__\s*=\s*["\'][^"\']*["\']',
-            f'__version__ = "{new_version}"',
-            content
-        )
+        updated_content, replaced = _DUNDER_VERSION_RE.subn(f'__version__ = "{new_version}"', content)
         
         # If __version__ wasn't found, add it
-        if '__version__' not in content:
+        if not replaced:
             updated_content = f'__version__ = "{new_version}"\n' + content
         
-        file_path.write_text(updated_content)
-        print(f"✅ Updated {file_path}")
-        return True
+        return _write_if_changed(file_path, content, updated_content, log)
     except Exception as e:
-        print(f"❌ Failed to update {file_path}: {e}")
+        log(f"❌ Failed to update {file_path}: {e}")
         return False
 
 def validate_version(version: str) -> bool:
     """Validate semantic version format"""
-    pattern = r'^\d+\.\d+\.\d+(-[a-zA-Z0-9]+(\.[a-zA-Z0-9]+)*)?$'
-    return bool(re.match(pattern, version))
+    # Cheap rejections before running the regex
+    if not version or version.count('.') < 2 or not version[0].isdigit():
+        return False
+    return bool(_SEMVER_RE.match(version))
 
 def get_current_version() -> str:
     """Get current version from pyproject.toml"""
     pyproject_path = Path("ios-bridge-cli/pyproject.toml")
     if pyproject_path.exists():
-        content = pyproject_path.read_text()
-        match = re.search(r'version\s*=\s*"([^"]*)"', content)
+        # The version line sits near the top of [project]; scan the head before parsing the whole file
+        with pyproject_path.open("rb") as f:
+            head = f.read(4096).decode("utf-8", errors="replace")
+        match = _PYPROJECT_VERSION_CAP_RE.search(head)
+        if match:
+            return match.group(1)
+        
+        match = _PYPROJECT_VERSION_CAP_RE.search(pyproject_path.read_text())
         if match:
             return match.group(1)
     return "unknown"
@@ -189,25 +225,32 @@ Examples:
     
     print(f"\n📝 Updating {total_count} files:")
     
-    for file_info in files_to_update:
+    def run_update(file_info: dict) -> Tuple[bool, List[str]]:
+        # Buffer each file's output so the concurrent updates print in order
+        lines: List[str] = []
         file_path = file_info['path']
-        update_func = file_info['update_func']
-        description = file_info['description']
-        
-        print(f"\n🔧 {description}")
-        print(f"   File: {file_path}")
         
-        if not file_path.exists():
-            print(f"   ⚠️  File not found")
-            if 'optional' not in str(file_path):
-                continue
+        lines.append(f"\n🔧 {file_info['description']}")
+        lines.append(f"   File: {file_path}")
         
         if args.dry_run:
-            print(f"   📋 Would update to version {new_version}")
+            if not file_path.exists():
+                lines.append(f"   ⚠️  File not found")
+                return False, lines
+            lines.append(f"   📋 Would update to version {new_version}")
+            return True, lines
+        
+        # Updaters report missing files themselves, saving a stat per file
+        return file_info['update_func'](file_path, new_version, lines.append), lines
+    
+    # The files are independent, so overlap their disk I/O
+    with ThreadPoolExecutor(max_workers=total_count) as executor:
+        results = list(executor.map(run_update, files_to_update))
+    
+    for updated, lines in results:
+        print("\n".join(lines))
+        if updated:
             success_count += 1
-        else:
-            if update_func(file_path, new_version):
-                success_count += 1
     
     print(f"\n📊 Summary:")
     print(f"   ✅ Successfully updated: {success_count}/{total_count} files")
@@ -3,8 +3,8 @@ Electron app manager with auto-download functionality for desktop streaming inte
 """
 import os
 import subprocess
-import time
 import json
+import hashlib
 import tempfile
 import shutil
 import signal
@@ -49,6 +49,14 @@ class ElectronAppManager:
         self.config_file: Optional[str] = None
         self.app_cache_dir = self._get_cache_dir()
         self.current_version = self._get_current_cli_version()
+        
+        # Bundled app paths, resolved once
+        self._pkg_dir = Path(__file__).parent
+        self._bundled_app_path = self._pkg_dir / "electron_app"
+        self._bundled_node_modules = self._bundled_app_path / "node_modules"
+        self._bundled_lockfile = self._bundled_app_path / "package-lock.json"
+        self._bundled_deps_sentinel = self._bundled_node_modules / ".deps_installed_for"
+        self._bundled_deps_installed = False
     
     def _get_cache_dir(self) -> Path:
         """Get the cache directory for downloaded apps"""
@@ -307,15 +315,22 @@ class ElectronAppManager:
         # Make Linux/macOS executables executable
         system, _ = self._get_platform_info()
         if system in ["Linux", "Darwin"]:
-            # Find and make executables executable
-            for item in extract_to.rglob("*"):
-                if item.is_file() and (
-                    item.name.startswith("ios-bridge-desktop") or
-                    item.suffix == ".app" or
-                    "iOS Bridge" in str(item)
-                ):
+            import stat
+            
+            # Find and make executables executable; os.walk filters on scandir
+            # entries, so only matching files are turned into Paths and stat'ed
+            for dirpath, _, filenames in os.walk(extract_to):
+                for name in filenames:
+                    full_path = os.path.join(dirpath, name)
+                    if not (
+                        name.startswith("ios-bridge-desktop") or
+                        name.endswith(".app") or
+                        "iOS Bridge" in full_path
+                    ):
+                        continue
+                    
+                    item = Path(full_path)
                     try:
-                        import stat
                         current_permissions = item.stat().st_mode
                         item.chmod(current_permissions | stat.S_IEXEC | stat.S_IXUSR | stat.S_IXGRP)
                         if self.verbose:
@@ -431,8 +446,7 @@ class ElectronAppManager:
     
     def _fallback_to_bundled_app(self):
         """Fallback to bundled Electron app if download fails"""
-        package_dir = Path(__file__).parent
-        electron_app_path = package_dir / "electron_app"
+        electron_app_path = self._bundled_app_path
         
         if not electron_app_path.exists():
             raise ElectronAppError("No bundled Electron app available and download failed")
@@ -441,7 +455,7 @@ class ElectronAppManager:
             print("📦 Using bundled Electron app (requires Node.js)")
         
         # Install dependencies if needed
-        if not (electron_app_path / "node_modules").exists():
+        if not self._bundled_deps_installed and self._bundled_deps_stale():
             if self.verbose:
                 print("📦 Installing Electron dependencies...")
             try:
@@ -453,8 +467,51 @@ class ElectronAppManager:
                 )
             except (subprocess.CalledProcessError, FileNotFoundError):
                 raise ElectronAppError("Failed to install dependencies. Please install Node.js and npm")
+            self._write_bundled_deps_sentinel()
+        self._bundled_deps_installed = True
+        
+        return electron_app_path
+    
+    def _bundled_lockfile_hash(self) -> Optional[str]:
+        """Hash of the bundled package-lock.json, or None if there is none"""
+        try:
+            return hashlib.sha256(self._bundled_lockfile.read_bytes()).hexdigest()
+        except FileNotFoundError:
+            return None
+    
+    def _bundled_deps_stale(self) -> bool:
+        """Check whether the bundled app's node_modules needs an npm install"""
+        try:
+            node_modules_mtime = self._bundled_node_modules.stat().st_mtime
+        except FileNotFoundError:
+            return True
         
-        return str(electron_app_path)
+        try:
+            lockfile_mtime = self._bundled_lockfile.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        
+        # Fast path: the lockfile hasn't changed since the last install
+        if lockfile_mtime <= node_modules_mtime:
+            return False
+        
+        # The lockfile was touched; only reinstall if its content changed
+        try:
+            installed_for = self._bundled_deps_sentinel.read_text().strip()
+        except OSError:
+            return True
+        return installed_for != self._bundled_lockfile_hash()
+    
+    def _write_bundled_deps_sentinel(self):
+        """Record which package-lock.json the bundled node_modules was installed for"""
+        lockfile_hash = self._bundled_lockfile_hash()
+        if lockfile_hash is None:
+            return
+        try:
+            self._bundled_deps_sentinel.write_text(lockfile_hash)
+        except OSError as e:
+            if self.verbose:
+                print(f"⚠️  Could not record installed dependencies: {e}")
     
     def start(self, config: Dict[str, Any]) -> int:
         """Start the Electron app with the given configuration"""
@@ -483,15 +540,14 @@ class ElectronAppManager:
                         f"Original error: {e}"
                     )
             
-            # Create temporary config file
-            with tempfile.NamedTemporaryFile(
-                mode='w',
+            # Create temporary config file, serialized up front and written in one call
+            payload = json.dumps(config, indent=2).encode()
+            fd, self.config_file = tempfile.mkstemp(
                 suffix='.json',
-                delete=False,
                 prefix='ios_bridge_config_'
-            ) as f:
-                json.dump(config, f, indent=2)
-                self.config_file = f.name
+            )
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
             
             # Launch the app
             if use_downloaded:
@@ -511,7 +567,9 @@ class ElectronAppManager:
                 cwd=str(app_path.parent) if use_downloaded else app_path,
                 stdout=stdout_target,
                 stderr=stderr_target,
-                preexec_fn=os.setsid if hasattr(os, 'setsid') else None
+                # Own process group, so stop() can take down Electron's helpers too
+                start_new_session=hasattr(os, 'killpg'),
+                creationflags=getattr(subprocess, 'CREATE_NEW_PROCESS_GROUP', 0)
             )
             
             # Wait for the process to complete
@@ -520,16 +578,8 @@ class ElectronAppManager:
             except KeyboardInterrupt:
                 if self.verbose:
                     print("\n🛑 Ctrl+C detected, stopping iOS Bridge Desktop...")
+                # stop() waits for the group and force-kills it if needed
                 self.stop()
-                
-                # Give the process time to cleanup before forcing exit
-                try:
-                    self.process.wait(timeout=3)
-                except subprocess.TimeoutExpired:
-                    if self.verbose:
-                        print("🛑 Force terminating desktop app...")
-                    self.process.kill()
-                
                 return 0
             
             if return_code != 0 and self.verbose:
@@ -562,10 +612,8 @@ class ElectronAppManager:
         """Stop the Electron app"""
         if self.process:
             try:
-                pid = self.process.pid
-                
-                # Try graceful termination first
-                self.process.terminate()
+                # Signal the whole group so renderer/GPU helpers go down with it
+                self._signal_app()
                 
                 # Wait for termination
                 try:
@@ -577,21 +625,8 @@ class ElectronAppManager:
                     if self.verbose:
                         print("⚡ Force stopping iOS Bridge Desktop...")
                     
-                    # Kill the process group if possible
-                    try:
-                        if hasattr(os, 'killpg'):
-                            os.killpg(os.getpgid(pid), signal.SIGTERM)
-                            time.sleep(0.5)
-                            try:
-                                os.killpg(os.getpgid(pid), signal.SIGKILL)
-                            except ProcessLookupError:
-                                pass  # Process already terminated
-                        else:
-                            self.process.kill()
-                        self.process.wait()
-                    except ProcessLookupError:
-                        # Process already terminated
-                        pass
+                    self._signal_app(force=True)
+                    self.process.wait()
                     
                     if self.verbose:
                         print("✅ iOS Bridge Desktop stopped")
@@ -604,6 +639,18 @@ class ElectronAppManager:
         
         self._cleanup()
     
+    def _signal_app(self, force: bool = False):
+        """Terminate (or kill) the app's process group, or just the process where groups aren't available"""
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(self.process.pid, signal.SIGKILL if force else signal.SIGTERM)
+            elif force:
+                self.process.kill()
+            else:
+                self.process.terminate()
+        except ProcessLookupError:
+            pass  # Process already terminated
+    
     def _cleanup(self):
         """Clean up temporary files"""
         if self.config_file and os.path.exists(self.config_file):
@@ -1053,8 +1053,11 @@ def start_server(ctx, port: int, host: str, server_path: str, background: bool):
                 start_new_session=True
             )
             
-            # Wait a moment to see if it starts successfully
-            time.sleep(2)
+            # Wait a moment to see if it starts successfully; returns at once if it exits
+            try:
+                process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                pass
             
             if process.poll() is None:
                 click.echo(f"✅ Server started in background (PID: {process.pid})")
@@ -1136,6 +1139,8 @@ def kill_server(ctx, force: bool, all: bool):
         killed_count = 0
         failed_count = 0
         
+        # Ask every process to terminate first, then wait for them together
+        terminating = []
         for proc in processes:
             try:
                 pid = proc['pid']
@@ -1146,19 +1151,7 @@ def kill_server(ctx, force: bool, all: bool):
                 
                 # Try graceful termination first
                 process.terminate()
-                
-                try:
-                    # Wait up to 3 seconds for graceful shutdown
-                    process.wait(timeout=3)
-                    click.echo(f"✅ Successfully stopped server (PID: {pid})")
-                    killed_count += 1
-                except psutil.TimeoutExpired:
-                    # Force kill if graceful shutdown failed
-                    if verbose:
-                        click.echo(f"⚡ Force killing process {pid}...")
-                    process.kill()
-                    click.echo(f"✅ Force killed server (PID: {pid})")
-                    killed_count += 1
+                terminating.append(process)
                     
             except psutil.NoSuchProcess:
                 if verbose:
@@ -1171,6 +1164,26 @@ def kill_server(ctx, force: bool, all: bool):
                 click.echo(f"❌ Error killing process {proc['pid']}: {e}", err=True)
                 failed_count += 1
         
+        # Wait up to 3 seconds in total for graceful shutdown
+        stopped, still_running = psutil.wait_procs(terminating, timeout=3)
+        for process in stopped:
+            click.echo(f"✅ Successfully stopped server (PID: {process.pid})")
+            killed_count += 1
+        
+        # Force kill whatever didn't shut down gracefully
+        for process in still_running:
+            try:
+                if verbose:
+                    click.echo(f"⚡ Force killing process {process.pid}...")
+                process.kill()
+                click.echo(f"✅ Force killed server (PID: {process.pid})")
+                killed_count += 1
+            except psutil.NoSuchProcess:
+                killed_count += 1
+            except psutil.AccessDenied:
+                click.echo(f"❌ Access denied killing process {process.pid}", err=True)
+                failed_count += 1
+        
         click.echo(f"\n📊 Summary: {killed_count} killed, {failed_count} failed")
         
         if killed_count > 0:
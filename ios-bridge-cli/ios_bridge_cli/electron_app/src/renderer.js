@@ -284,7 +284,7 @@ class IOSBridgeRenderer {
             // Create WebSocket URLs
             const wsBase = serverUrl.replace('http://', 'ws://').replace('https://', 'wss://');
             const wsUrls = {
-                video: `${wsBase}/ws/${sessionId}/video`,
+                video: `${wsBase}/ws/${sessionId}/video?format=binary`,
                 webrtc: `${wsBase}/ws/${sessionId}/webrtc`,
                 control: `${wsBase}/ws/${sessionId}/control`
             };
@@ -332,6 +332,7 @@ class IOSBridgeRenderer {
     connectWebSocket(type, url) {
         return new Promise((resolve, reject) => {
             const ws = new WebSocket(url);
+            ws.binaryType = 'arraybuffer';
             let resolved = false;
             
             ws.onopen = () => {
@@ -832,7 +833,9 @@ class IOSBridgeRenderer {
     
     handleWebSocketMessage(type, data) {
         try {
-            const message = JSON.parse(data);
+            const message = typeof data === 'string'
+                ? JSON.parse(data)
+                : this.parseBinaryVideoFrame(data);
             
             if (type === 'video' && message.type === 'video_frame') {
                 this.handleVideoFrame(message);
@@ -843,6 +846,16 @@ class IOSBridgeRenderer {
         }
     }
     
+    parseBinaryVideoFrame(buffer) {
+        // Layout: uint32 header length, uint32 image length (little endian), JSON header, JPEG bytes
+        const view = new DataView(buffer);
+        const headerLength = view.getUint32(0, true);
+        const imageLength = view.getUint32(4, true);
+        const message = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+        message.blob = new Blob([new Uint8Array(buffer, 8 + headerLength, imageLength)], { type: 'image/jpeg' });
+        return message;
+    }
+    
     handleVideoFrame(frameData) {
         if (!this.canvas || !this.ctx) {
             return;
@@ -863,9 +876,12 @@ class IOSBridgeRenderer {
                 // console.log(`Updated device point dimensions: ${this.deviceDimensions.width}x${this.deviceDimensions.height}`);
             }
             
-            // Create image from base64 data
+            // Create image from the binary frame, or base64 data for JSON frames
             const img = new Image();
+            const objectUrl = frameData.blob ? URL.createObjectURL(frameData.blob) : null;
             img.onload = () => {
+                if (objectUrl) URL.revokeObjectURL(objectUrl);
+                
                 // Update stream pixel dimensions
                 if (img.width && img.height && (img.width !== this.streamDimensions.width || img.height !== this.streamDimensions.height)) {
                     this.streamDimensions = { width: img.width, height: img.height };
@@ -893,10 +909,11 @@ class IOSBridgeRenderer {
             };
             
             img.onerror = (error) => {
+                if (objectUrl) URL.revokeObjectURL(objectUrl);
                 console.error('Image load error:', error);
             };
             
-            img.src = `data:image/jpeg;base64,${frameData.data}`;
+            img.src = objectUrl || `data:image/jpeg;base64,${frameData.data}`;
             
         } catch (error) {
             console.error('Error handling video frame:', error);
@@ -10,4 +10,13 @@ from app.main import app
 if __name__ == "__main__":
     import uvicorn
     from app.config.settings import settings
-    uvicorn.run(app, host=settings.HOST, port=settings.PORT, log_level=settings.LOG_LEVEL.lower())
\ No newline at end of file
+    uvicorn.run(
+        app,
+        host=settings.HOST,
+        port=settings.PORT,
+        backlog=settings.BACKLOG,
+        log_level=settings.LOG_LEVEL.lower(),
+        loop=settings.UVICORN_LOOP,
+        http=settings.UVICORN_HTTP,
+        access_log=settings.UVICORN_ACCESS_LOG
+    )
\ No newline at end of file